@@ -0,0 +1,68 @@
+import argparse
+import json
+import time
+
+from libft2gan.dataset_voxaug_new import VoxAugDataset
+
+def disk_read_bytes():
+    # bytes this process actually pulled from storage, linux only
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('read_bytes'))
+    except (OSError, StopIteration):
+        return None
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--instrumental_lib', type=str, required=True) # | separated, npz directories or packed shards
+    p.add_argument('--vocal_lib', type=str, default='') # | separated, ignored with --validation
+    p.add_argument('--validation', action='store_true') # read inputs and targets like the validation set does
+    p.add_argument('--cropsize', type=int, default=256)
+    p.add_argument('--hop_length', '-H', type=int, default=1024)
+    p.add_argument('--samples', type=int, default=512)
+    p.add_argument('--seed', '-s', type=int, default=51)
+    p.add_argument('--bench_output', type=str, default='')
+    args = p.parse_args()
+
+    dataset = VoxAugDataset(
+        instrumental_lib=args.instrumental_lib.split('|'),
+        vocal_lib=args.vocal_lib.split('|') if args.vocal_lib != '' else [],
+        is_validation=args.validation,
+        hop_length=args.hop_length,
+        cropsize=args.cropsize,
+        seed=args.seed
+    )
+
+    samples = min(args.samples, len(dataset))
+    disk_start = disk_read_bytes()
+    start = time.perf_counter()
+
+    for idx in range(samples):
+        dataset[idx]
+
+    seconds = time.perf_counter() - start
+    disk_end = disk_read_bytes()
+    io_bytes = dataset.io_bytes
+
+    result = {
+        'samples': samples,
+        'cropsize': args.cropsize,
+        'full_bytes_per_sample': io_bytes['full'] / samples,
+        'read_bytes_per_sample': io_bytes['read'] / samples,
+        'reduction': io_bytes['full'] / max(io_bytes['read'], 1),
+        'disk_bytes_per_sample': (disk_end - disk_start) / samples if disk_start is not None else None,
+        'samples_per_second': samples / seconds
+    }
+
+    print(f'{samples} samples at cropsize {args.cropsize}: {result["samples_per_second"]:.1f} samples/s')
+    print(f'before {result["full_bytes_per_sample"] / 1024 ** 2:.2f} MB/sample, after {result["read_bytes_per_sample"] / 1024 ** 2:.2f} MB/sample ({result["reduction"]:.1f}x less)')
+
+    if result['disk_bytes_per_sample'] is not None:
+        print(f'disk reads {result["disk_bytes_per_sample"] / 1024 ** 2:.2f} MB/sample (0 when the files are already in the page cache)')
+
+    if args.bench_output != '':
+        with open(args.bench_output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
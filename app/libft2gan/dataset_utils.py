@@ -1,3 +1,4 @@
+import functools
 import torch
 import torch.nn.functional as F
 import numpy as np
@@ -97,23 +98,77 @@ def apply_time_stretch(M, random, target_size):
 
     return H
 
-def to_wave(X, n_fft=2048, hop_length=1024):
-    left_X = X[0]
-    right_X = X[1]
+@functools.lru_cache(maxsize=None)
+def hann_window(n_fft):
+    # periodic hann, the window librosa uses for 'hann'; cached and read-only since every call shares it
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    window.setflags(write=False)
 
-    left_W = librosa.istft(left_X, hop_length=hop_length)
-    right_W = librosa.istft(right_X, hop_length=hop_length)
+    return window
 
-    return np.stack([left_W, right_W], axis=0)
+def stft(wave, hop_length=1024, n_fft=2048, center=True, pad_mode='constant', block_frames=1024):
+    # librosa.stft over the last axis, but every leading axis (channels, clips) goes through each fft call together;
+    # (..., samples) float32 -> (..., n_fft // 2 + 1, frames) complex64
+    wave = np.asarray(wave, dtype=np.float32)
+    if center:
+        wave = np.pad(wave, [(0, 0)] * (wave.ndim - 1) + [(n_fft // 2, n_fft // 2)], mode=pad_mode)
 
-def from_wave(W, n_fft=2048, hop_length=1024):
-    left_W = W[0]
-    right_W = W[1]
+    n_frames = max(1 + (wave.shape[-1] - n_fft) // hop_length, 0)
+    frames = np.lib.stride_tricks.sliding_window_view(wave, n_fft, axis=-1)[..., ::hop_length, :][..., :n_frames, :]
+    window = hann_window(n_fft)
+
+    spec = np.empty(wave.shape[:-1] + (n_fft // 2 + 1, n_frames), dtype=np.complex64)
+    # a block of frames at a time keeps the windowed copy small whatever the track length
+    for start in range(0, n_frames, block_frames):
+        block = np.fft.rfft(frames[..., start:start + block_frames, :] * window, axis=-1)
+        spec[..., start:start + block_frames] = np.swapaxes(block, -1, -2)
+
+    return spec
+
+def _overlap_add(frames, hop_length, size):
+    # frames (..., n_fft, n_frames); when hop divides n_fft every frame's r-th hop-sized segment lands on a
+    # contiguous run of the output, so the sum is n_fft // hop slice adds instead of one per frame
+    n_fft, n_frames = frames.shape[-2], frames.shape[-1]
+    out = np.zeros(frames.shape[:-2] + (size,), dtype=np.float32)
+
+    if n_fft % hop_length == 0:
+        segments = frames.reshape(frames.shape[:-2] + (n_fft // hop_length, hop_length, n_frames))
+
+        for r in range(n_fft // hop_length):
+            out[..., r * hop_length:(r + n_frames) * hop_length] += np.swapaxes(segments[..., r, :, :], -1, -2).reshape(frames.shape[:-2] + (n_frames * hop_length,))
+    else:
+        for i in range(n_frames):
+            out[..., i * hop_length:i * hop_length + n_fft] += frames[..., :, i]
 
-    left_X = librosa.stft(left_W, n_fft=n_fft, hop_length=hop_length)
-    right_X = librosa.stft(right_W, n_fft=n_fft, hop_length=hop_length)
+    return out
 
-    return np.stack([left_X, right_X], axis=0)
+def istft(spec, hop_length=1024, center=True, block_frames=1024):
+    # librosa.istft over the last two axes, batched over the rest; (..., bins, frames) -> (..., samples) float32
+    n_fft = 2 * (spec.shape[-2] - 1)
+    n_frames = spec.shape[-1]
+    window = hann_window(n_fft)
+    size = n_fft + hop_length * (n_frames - 1)
+
+    frames = np.empty(spec.shape[:-2] + (n_fft, n_frames), dtype=np.float32)
+    for start in range(0, n_frames, block_frames):
+        frames[..., start:start + block_frames] = np.fft.irfft(spec[..., start:start + block_frames], n=n_fft, axis=-2) * window[:, None]
+
+    wave = _overlap_add(frames, hop_length, size)
+    norm = _overlap_add(np.broadcast_to(np.square(window)[:, None], (n_fft, n_frames)), hop_length, size)
+    nonzero = norm > np.finfo(np.float32).tiny
+    wave[..., nonzero] /= norm[nonzero]
+
+    if center:
+        wave = wave[..., n_fft // 2:-(n_fft // 2)]
+
+    return wave
+
+def to_wave(X, n_fft=2048, hop_length=1024):
+    return istft(X[:2], hop_length)
+
+def from_wave(W, n_fft=2048, hop_length=1024):
+    # reflect padding matches the spectrograms lib/spec_utils builds the dataset with
+    return stft(W[:2], hop_length, n_fft, pad_mode='reflect')
 
 def apply_harmonic_distortion(M, P, random, c, num_harmonics=2, gain=0.1, n_fft=2048, hop_length=1024):
     left_M = M[0] / c
@@ -126,8 +181,7 @@ def apply_harmonic_distortion(M, P, random, c, num_harmonics=2, gain=0.1, n_fft=
 
     librosa.effects.pitch_shift()
 
-    left_s = librosa.istft(left_X, hop_length=hop_length)
-    right_s = librosa.istft(right_X, hop_length=hop_length)
+    left_s, right_s = istft(np.stack([left_X, right_X]), hop_length)
 
     left_ds = np.copy(left_s)
     right_ds = np.copy(right_s)
@@ -140,8 +194,7 @@ def apply_harmonic_distortion(M, P, random, c, num_harmonics=2, gain=0.1, n_fft=
     left_s = np.nan_to_num(left_s, nan=0, neginf=-1, posinf=1)
     right_s = np.nan_to_num(right_s, nan=0, neginf=-1, posinf=1)
 
-    left_X = librosa.stft(left_ds, n_fft=n_fft, hop_length=hop_length)
-    right_X = librosa.stft(right_ds, n_fft=n_fft, hop_length=hop_length)
+    left_X, right_X = stft(np.stack([left_ds, right_ds]), hop_length, n_fft, pad_mode='reflect')
     
     left_M = np.abs(left_X) * c
     right_M = np.abs(right_X) * c
@@ -8,6 +8,8 @@ import librosa
 
 import pedalboard
 
+from libft2gan.shard_store import ShardStore, is_store, open_npz
+
 def normalize_waveform(W, W2=None):
     if W2 is not None:
         normalized_waveform = W / np.max([1, np.abs(W).max(), np.abs(W2).max()])
@@ -45,8 +47,18 @@ class VoxAugDataset(torch.utils.data.Dataset):
         self.cropsize = cropsize
 
         self.random = random.Random(seed)
+        self.stores = {}
+
+        # bytes of waveform per sample: 'full' is every array the old loader read, 'read' what the crops actually read
+        self.io_bytes = { 'samples': 0, 'full': 0, 'read': 0 }
 
         for mp in instrumental_lib:
+            # packed shards from pack_shards.py are read in place of the per-patch npz files
+            if is_store(mp):
+                store = self.stores.setdefault(mp, ShardStore(mp))
+                self.curr_list.extend((mp, i) for i in range(len(store)))
+                continue
+
             mixes = [os.path.join(mp, f) for f in os.listdir(mp) if os.path.isfile(os.path.join(mp, f))]
 
             for m in mixes:
@@ -55,6 +67,11 @@ class VoxAugDataset(torch.utils.data.Dataset):
             
         if not is_validation and len(vocal_lib) != 0:
             for vp in vocal_lib:
+                if is_store(vp):
+                    store = self.stores.setdefault(vp, ShardStore(vp))
+                    self.vocal_list.extend((vp, i) for i in range(len(store)))
+                    continue
+
                 vox = [os.path.join(vp, f) for f in os.listdir(vp) if os.path.isfile(os.path.join(vp, f))]
 
                 for v in vox:
@@ -62,7 +79,7 @@ class VoxAugDataset(torch.utils.data.Dataset):
                         self.vocal_list.append(v)
 
         def key(p):
-            return os.path.basename(p)
+            return os.path.basename(p) if isinstance(p, str) else self.stores[p[0]].names[p[1]]
         
         self.vocal_list.sort(key=key)
         self.curr_list.sort(key=key)
@@ -77,17 +94,33 @@ class VoxAugDataset(torch.utils.data.Dataset):
     def __len__(self):
         return len(self.curr_list)
 
-    def _get_vocals(self, idx):
-        path = str(self.vocal_list[(self.epoch + idx) % len(self.vocal_list)])
-        vdata = np.load(path, allow_pickle=True)
-            
-        W, Vc = vdata['XW'][:2], vdata['c']
-        
-        if (W.shape[1] // self.hop_length) > self.cropsize:
-            start = self.random.randint(0, (W.shape[1] // self.hop_length) - self.cropsize - 1)
+    def _read(self, item, targets=False):
+        # (XW crop, YW crop or None, c) from either a shard or an npz file; the crop is picked before any samples are
+        # touched so memory-mapped shards and np.savez files only read the cropsize * hop_length samples in use
+        if isinstance(item, str):
+            data = open_npz(item)
+            XW, YW, c = data['XW'][:2], data['YW'][:2] if 'YW' in data else None, data['c']
+        else:
+            store, idx = item
+            XW, YW, c = self.stores[store].get(idx)
+
+        ws, we = 0, XW.shape[1]
+        if (XW.shape[1] // self.hop_length) > self.cropsize:
+            start = self.random.randint(0, (XW.shape[1] // self.hop_length) - self.cropsize - 1)
             ws = start * self.hop_length
             we = (start + self.cropsize) * self.hop_length
-            W = W[:, ws:we]
+
+        arrays = [XW, YW] if targets and YW is not None else [XW]
+        crops = [np.array(W[:, ws:we]) for W in arrays]
+
+        # compressed npz members were inflated whole no matter the crop
+        self.io_bytes['full'] += sum(W.nbytes for W in [XW, YW] if W is not None)
+        self.io_bytes['read'] += sum(crop.nbytes if isinstance(W, np.memmap) else W.nbytes for W, crop in zip(arrays, crops))
+
+        return crops[0], crops[1] if len(crops) > 1 else None, c
+
+    def _get_vocals(self, idx):
+        W, _, Vc = self._read(self.vocal_list[(self.epoch + idx) % len(self.vocal_list)])
 
         augmentations = [
             (0.2, pedalboard.Compressor(threshold_db=np.random.uniform(-30,-10), ratio=np.random.uniform(1.5, 10.0), attack_ms=np.random.uniform(1,50), release_ms=np.random.uniform(50,500))),
@@ -142,12 +175,6 @@ class VoxAugDataset(torch.utils.data.Dataset):
         return W#, WP, VP
 
     def _augment_instruments(self, W):
-        if (W.shape[1] // self.hop_length) > self.cropsize:
-            start = self.random.randint(0, (W.shape[1] // self.hop_length) - self.cropsize - 1)
-            ws = start * self.hop_length
-            we = (start + self.cropsize) * self.hop_length
-            W = W[:, ws:we]
-
         augmentations = [
             # (0.1, pedalboard.Compressor(threshold_db=np.random.uniform(-30,-10), ratio=np.random.uniform(1.5, 10.0), attack_ms=np.random.uniform(1,50), release_ms=np.random.uniform(50,500))),
             # (0.1, pedalboard.Distortion(drive_db=np.random.uniform(0,15))),
@@ -184,25 +211,15 @@ class VoxAugDataset(torch.utils.data.Dataset):
         return W
     
     def __getitem__(self, idx):
-        path = str(self.curr_list[idx % len(self.curr_list)])
-        data = np.load(path, allow_pickle=True)
-        aug = 'YW' not in data.files
-
-        XW, c = data['XW'][:2], data['c']
-        YW  = XW if aug else data['YW'][:2]
+        # training mixes its own target from XW, so YW is only read for validation
+        XW, YW, c = self._read(self.curr_list[idx % len(self.curr_list)], targets=self.is_validation)
+        YW = XW if YW is None else YW
+        self.io_bytes['samples'] += 1
 
         if not self.is_validation:
             YW = self._augment_instruments(XW)
             VW = self._get_vocals(idx)
             XW = normalize_waveform(YW) + normalize_waveform(VW)
-            
-        elif self.is_validation:
-            if (XW.shape[1] // self.hop_length) > self.cropsize:
-                start = self.random.randint(0, (XW.shape[1] // self.hop_length) - self.cropsize - 1)
-                ws = start * self.hop_length
-                we = (start + self.cropsize) * self.hop_length
-                XW = XW[:, ws:we]
-                YW = YW[:, ws:we]
 
         XW = normalize_waveform(XW, YW)
         YW = normalize_waveform(YW, XW)
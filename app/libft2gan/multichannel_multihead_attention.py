@@ -8,11 +8,13 @@ from libft2gan.multichannel_linear import MultichannelLinear
 from libft2gan.multichannel_layernorm import MultichannelLayerNorm
 
 class MultichannelMultiheadAttention(nn.Module):
-    def __init__(self, channels, attention_maps, num_heads, features, kernel_size=3, padding=1, mem_channels=None, dtype=torch.float):
+    def __init__(self, channels, attention_maps, num_heads, features, kernel_size=3, padding=1, mem_channels=None, dtype=torch.float, query_chunk_size=None, residual_dtype=None):
         super().__init__()
 
         self.attention_maps = attention_maps
         self.num_heads = num_heads
+        self.query_chunk_size = query_chunk_size
+        self.residual_dtype = residual_dtype
         self.embedding = RotaryEmbedding(features // num_heads, dtype=dtype)
 
         self.q_proj = nn.Sequential(
@@ -34,12 +36,42 @@ class MultichannelMultiheadAttention(nn.Module):
         q = self.embedding.rotate_queries_or_keys(self.q_proj(x).transpose(2,3).reshape(b,self.attention_maps,w,self.num_heads,-1).permute(0,1,3,2,4))
         k = self.embedding.rotate_queries_or_keys(self.k_proj(x if mem is None else mem).transpose(2,3).reshape(b,self.attention_maps,w,self.num_heads,-1).permute(0,1,3,2,4)).transpose(3,4)
         v = self.v_proj(x if mem is None else mem).transpose(2,3).reshape(b,self.attention_maps,w,self.num_heads,-1).permute(0,1,3,2,4)
-        qk = torch.matmul(q,k) / math.sqrt(h)
 
-        if prev_qk is not None:
-            qk = qk + prev_qk
+        if self.query_chunk_size is not None and self.query_chunk_size < w:
+            a, qk = self.chunked_attention(q, k, v, h, prev_qk)
+        else:
+            qk = torch.matmul(q,k) / math.sqrt(h)
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
+            if prev_qk is not None:
+                qk = qk + prev_qk
+
+            a = torch.matmul(F.softmax(qk, dim=-1),v)
+
+            if self.residual_dtype is not None:
+                qk = qk.to(self.residual_dtype)
+
+        a = a.transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
         out = self.o_proj(a)
 
-        return out, qk
\ No newline at end of file
+        return out, qk
+
+    # computes the scores one block of queries at a time so the prev_qk sum and the softmax only ever exist as a
+    # [chunk x w] slice; the residual scores for the next layer are still a full [w x w] tensor, since the decoders
+    # reuse an encoder's scores as both prev_qk and skip_qk and they can't be accumulated in place. storing them at
+    # residual_dtype halves that tensor, the chunking itself only saves the softmax temporaries
+    def chunked_attention(self, q, k, v, h, prev_qk=None):
+        b,c,heads,w,_ = q.shape
+        qk = torch.empty((b,c,heads,w,k.shape[-1]), dtype=q.dtype if self.residual_dtype is None else self.residual_dtype, device=q.device)
+        a = torch.empty((b,c,heads,w,v.shape[-1]), dtype=v.dtype, device=v.device)
+
+        for start in range(0, w, self.query_chunk_size):
+            end = start + self.query_chunk_size
+            qk_chunk = torch.matmul(q[:,:,:,start:end],k) / math.sqrt(h)
+
+            if prev_qk is not None:
+                qk_chunk = qk_chunk + prev_qk[:,:,:,start:end].type_as(qk_chunk)
+
+            a[:,:,:,start:end] = torch.matmul(F.softmax(qk_chunk, dim=-1),v).type_as(a)
+            qk[:,:,:,start:end] = qk_chunk.type_as(qk)
+
+        return a, qk
\ No newline at end of file
@@ -0,0 +1,147 @@
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+# a shard is a directory of plain .npy files: XW.npy and YW.npy hold every patch's waveform back to back along the
+# sample axis, index.npy has one (xw_start, length, yw_start) row per patch (yw_start -1 for vocal-augmented patches
+# that only have XW), c.npy the per-patch scale and names.json the npz basenames the patches came from
+INDEX = 'index.npy'
+
+def is_shard(path):
+    return os.path.isfile(os.path.join(path, INDEX))
+
+def find_shards(path):
+    if is_shard(path):
+        return [path]
+
+    if not os.path.isdir(path):
+        return []
+
+    return sorted(os.path.join(path, d) for d in os.listdir(path) if is_shard(os.path.join(path, d)))
+
+def is_store(path):
+    return len(find_shards(path)) > 0
+
+def _npz_member(path, zf, info):
+    # members written by np.savez are stored as is, so they're memory-mapped where they sit in the zip and a crop only
+    # pages in its own samples; np.savez_compressed members have to be inflated whole
+    if info.compress_type != zipfile.ZIP_STORED:
+        with zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=True)
+
+    with open(path, 'rb') as f:
+        f.seek(info.header_offset)
+        name_length, extra_length = struct.unpack('<HH', f.read(30)[26:30])
+        f.seek(info.header_offset + 30 + name_length + extra_length)
+
+        version = np.lib.format.read_magic(f)
+        read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+        shape, fortran_order, dtype = read_header(f)
+        offset = f.tell()
+
+    if dtype.hasobject or len(shape) == 0:
+        with zf.open(info) as f:
+            return np.lib.format.read_array(f, allow_pickle=True)
+
+    return np.memmap(path, dtype=dtype, mode='c', offset=offset, shape=shape, order='F' if fortran_order else 'C')
+
+def open_npz(path):
+    # member name -> array, like np.load(path) but with the waveforms mapped instead of read
+    with zipfile.ZipFile(path) as zf:
+        return { os.path.splitext(info.filename)[0]: _npz_member(path, zf, info) for info in zf.infolist() if info.filename.endswith('.npy') }
+
+class ShardWriter(object):
+    def __init__(self, path):
+        self.path = path
+        self.XW = []
+        self.YW = []
+        self.index = []
+        self.c = []
+        self.names = []
+        self.xw_size = 0
+        self.yw_size = 0
+
+    @property
+    def nbytes(self):
+        return sum(w.nbytes for w in self.XW) + sum(w.nbytes for w in self.YW)
+
+    def add(self, name, XW, c, YW=None):
+        XW = XW[:2]
+        if YW is not None:
+            n = min(XW.shape[1], YW.shape[1])
+            XW, YW = XW[:, :n], YW[:2, :n]
+
+        self.index.append((self.xw_size, XW.shape[1], self.yw_size if YW is not None else -1))
+        self.XW.append(XW)
+        self.xw_size += XW.shape[1]
+
+        if YW is not None:
+            self.YW.append(YW)
+            self.yw_size += YW.shape[1]
+
+        self.c.append(c)
+        self.names.append(name)
+
+    def close(self):
+        os.makedirs(self.path, exist_ok=True)
+        dtype = self.XW[0].dtype if self.XW else np.float32
+
+        np.save(os.path.join(self.path, 'XW.npy'), np.concatenate(self.XW, axis=1) if self.XW else np.zeros((2, 0), dtype=dtype))
+        np.save(os.path.join(self.path, 'YW.npy'), np.concatenate(self.YW, axis=1) if self.YW else np.zeros((2, 0), dtype=dtype))
+        np.save(os.path.join(self.path, 'c.npy'), np.asarray(self.c, dtype=np.float32))
+
+        with open(os.path.join(self.path, 'names.json'), 'w') as f:
+            json.dump(self.names, f)
+
+        # the index goes last, a shard without one is an interrupted write and is ignored
+        np.save(os.path.join(self.path, INDEX), np.asarray(self.index, dtype=np.int64).reshape(-1, 3))
+
+class ShardStore(object):
+    # patches from every shard under the given paths; arrays are memory-mapped copy-on-write, so a patch is a view
+    # into the page cache and in-place augmentation only copies the pages it touches
+    def __init__(self, paths):
+        self.shards = [s for p in ([paths] if isinstance(paths, str) else paths) for s in find_shards(p)]
+        self.items = []
+        self.names = []
+
+        for i, shard in enumerate(self.shards):
+            with open(os.path.join(shard, 'names.json'), 'r') as f:
+                names = json.load(f)
+
+            self.items.extend((i, row) for row in range(len(names)))
+            self.names.extend(names)
+
+        self.arrays = None
+
+    def __getstate__(self):
+        # dataloader workers open their own maps rather than receiving pickled copies of the data
+        state = self.__dict__.copy()
+        state['arrays'] = None
+        return state
+
+    def __len__(self):
+        return len(self.items)
+
+    def _open(self):
+        if self.arrays is None:
+            self.arrays = [{
+                'XW': np.load(os.path.join(shard, 'XW.npy'), mmap_mode='c'),
+                'YW': np.load(os.path.join(shard, 'YW.npy'), mmap_mode='c'),
+                'c': np.load(os.path.join(shard, 'c.npy')),
+                'index': np.load(os.path.join(shard, INDEX))
+            } for shard in self.shards]
+
+        return self.arrays
+
+    def get(self, idx):
+        shard, row = self.items[idx]
+        arrays = self._open()[shard]
+        xw_start, length, yw_start = arrays['index'][row]
+
+        XW = arrays['XW'][:, xw_start:xw_start + length]
+        YW = arrays['YW'][:, yw_start:yw_start + length] if yw_start >= 0 else None
+
+        return XW, YW, arrays['c'][row]
@@ -0,0 +1,55 @@
+import argparse
+import multiprocessing
+import os
+
+import numpy as np
+from tqdm import tqdm
+
+from libft2gan.shard_store import ShardWriter, find_shards
+
+def read_patch(path):
+    data = np.load(path, allow_pickle=True)
+    YW = data['YW'][:2] if 'YW' in data.files else None
+
+    return os.path.basename(path), data['XW'][:2], YW, data['c']
+
+def pack(source, output, shard_bytes, workers):
+    files = sorted(os.path.join(source, f) for f in os.listdir(source) if f.endswith('.npz'))
+    os.makedirs(output, exist_ok=True)
+
+    if find_shards(output):
+        raise ValueError(f'{output} already has shards, remove them or pick another --output')
+
+    shard = 0
+    writer = ShardWriter(os.path.join(output, f'shard-{shard:05d}'))
+
+    # decompressing the npz files is the slow part, so workers read them while this process writes in order
+    with multiprocessing.Pool(workers) as pool:
+        for name, XW, YW, c in tqdm(pool.imap(read_patch, files, chunksize=16), total=len(files), desc=source):
+            writer.add(name, XW, c, YW)
+
+            if writer.nbytes >= shard_bytes:
+                writer.close()
+                shard += 1
+                writer = ShardWriter(os.path.join(output, f'shard-{shard:05d}'))
+
+    if writer.names:
+        writer.close()
+        shard += 1
+
+    print(f'{source}: {len(files)} patches in {shard} shards under {output}')
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--libs', type=str, required=True) # | separated npz directories, like --instrumental_lib
+    p.add_argument('--output_suffix', type=str, default='_SHARDS') # each library is packed next to itself as <lib><suffix>
+    p.add_argument('--shard_size', type=float, default=2) # GB of waveform per shard
+    p.add_argument('--num_workers', '-w', type=int, default=8)
+    args = p.parse_args()
+
+    for lib in [p for p in args.libs.split('|')]:
+        lib = lib.rstrip('/\\')
+        pack(lib, lib + args.output_suffix, int(args.shard_size * 1024 ** 3), args.num_workers)
+
+if __name__ == '__main__':
+    main()
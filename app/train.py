@@ -1,4 +1,5 @@
 import argparse
+import atexit
 import logging
 import os
 import random
@@ -13,6 +14,7 @@ import wandb
 
 from libft2gan.dataset_voxaug_new import VoxAugDataset
 from libft2gan.frame_transformer4 import FrameTransformerGenerator
+from libft2gan.layer_profiler import LayerProfiler
 from libft2gan.lr_scheduler_linear_warmup import LinearWarmupScheduler
 from libft2gan.lr_scheduler_polynomial_decay import PolynomialDecayScheduler
 
@@ -214,6 +216,9 @@ def main():
     p.add_argument('--progress_bar', '-pb', type=str, default='true')
     p.add_argument('--save_all', type=str, default='true')
     p.add_argument('--debug', action='store_true')
+    p.add_argument('--profile_layers', type=str, default='') # write per-module forward time, flops and activation size as a chrome trace json
+    p.add_argument('--profile_steps', type=int, default=20) # forward passes profiled before the hooks remove themselves
+    p.add_argument('--profile_depth', type=int, default=1)
     p.add_argument('--wandb', type=str, default='false')
     p.add_argument('--wandb_project', type=str, default='VOCAL-REMOVER')
     p.add_argument('--wandb_entity', type=str, default='carperbr')
@@ -286,6 +291,13 @@ def main():
         device = torch.device('cuda:{}'.format(args.gpu))
         generator.to(device)
 
+    profiler = None
+    if args.profile_layers != '':
+        profiler = LayerProfiler(args.profile_layers, args.profile_steps).attach(generator, depth=args.profile_depth)
+
+        # interrupted or crashed runs still write what was profiled
+        atexit.register(profiler.close)
+
     if args.distributed:
         generator = nn.parallel.DistributedDataParallel(generator, device_ids=[args.gpu])
 
@@ -369,6 +381,9 @@ def main():
             torch.save(generator.state_dict(), f'{model_path}.stg1.{"phase" if args.predict_phase else "mag"}.pth')
         epoch += 1
 
+    if profiler is not None:
+        profiler.close()
+
     if args.distributed:
         torch.distributed.destroy_process_group()
 
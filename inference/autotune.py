@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+import torch
+
+import inference
+from bench import RssSampler
+from lib import autotune
+from lib import registry
+
+def probe(model, device, args, cropsize, padding, batchsize):
+    sp = inference.Separator(model, device, batchsize, cropsize, 2048, autoregressive=model.autoregressive, precision=args.precision)
+    frames = cropsize + padding * 2
+    X_batch = [np.random.rand(2, 1025, frames).astype(np.float32) for _ in range(batchsize)]
+
+    if device.type == 'cuda':
+        torch.cuda.empty_cache()
+        torch.cuda.reset_peak_memory_stats(device)
+
+    model.eval()
+    with RssSampler() as rss:
+        # first pass is warmup: cudnn algorithm search, allocator growth, rotary caches
+        sp._reset(frames)
+        sp._predict(X_batch, padding)
+
+        start = time.perf_counter()
+        for _ in range(args.probe_runs):
+            sp._reset(frames)
+            sp._predict(X_batch, padding)
+
+        elapsed = (time.perf_counter() - start) / args.probe_runs
+
+    peak = torch.cuda.max_memory_allocated(device) if device.type == 'cuda' else rss.peak
+
+    # padding is recomputed context, only the centre of each crop counts towards throughput
+    return { 'cropsize': cropsize, 'padding': padding, 'batchsize': batchsize, 'frames_per_second': batchsize * cropsize / elapsed, 'peak_mb': peak / 1024 ** 2 }
+
+def tune_model(model, name, device, args, budget):
+    results = []
+
+    # v9 conditions each crop on the previous ones, so it only ever runs one unpadded crop at a time
+    paddings = [0] if model.autoregressive else args.paddings
+    batchsizes = [1] if model.autoregressive else args.batchsizes
+
+    for cropsize in args.cropsizes:
+        for padding in paddings:
+            for batchsize in batchsizes:
+                print(f'{name}: cropsize {cropsize} padding {padding} batchsize {batchsize}...', end=' ')
+
+                try:
+                    result = probe(model, device, args, cropsize, padding, batchsize)
+                except Exception as e:
+                    if not autotune.is_out_of_memory(e):
+                        raise
+
+                    # larger batches at this crop only need more, so stop at the first that doesn't fit
+                    print('out of memory')
+                    break
+
+                if result['peak_mb'] * 1024 ** 2 > budget:
+                    print(f'{result["peak_mb"]:.0f}MB over budget')
+                    break
+
+                print(f'{result["frames_per_second"]:.0f} frames/s, {result["peak_mb"]:.0f}MB')
+                results.append(result)
+
+    if device.type == 'cuda':
+        torch.cuda.empty_cache()
+
+    return max(results, key=lambda r: r['frames_per_second']) if results else None
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--cropsizes', type=str, default='256,512,1024,2048,4096')
+    p.add_argument('--paddings', type=str, default='0,64,256')
+    p.add_argument('--batchsizes', type=str, default='1,2,4,8,16')
+    p.add_argument('--memory_budget', type=float, default=0) # GB, 0 for 90% of the device's memory
+    p.add_argument('--probe_runs', type=int, default=3)
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+    args.cropsizes = [int(v) for v in args.cropsizes.split(',')]
+    args.paddings = [int(v) for v in args.paddings.split(',')]
+    args.batchsizes = sorted([int(v) for v in args.batchsizes.split(',')])
+    args.autotune = 'off'
+    args.mask_cache = ''
+
+    device, models, _ = inference.load_models(args)
+    budget = args.memory_budget * 1024 ** 3 if args.memory_budget > 0 else autotune.memory_budget(device) * 0.9
+    path = args.autotune_profile if args.autotune_profile != '' else autotune.default_profile_path()
+
+    entries = {}
+    for model, name in zip(models, registry.selected(args.models)):
+        if getattr(model, 'frames', None) is not None:
+            print(f'{name}: fixed-frame artifact, nothing to tune')
+            continue
+
+        best = tune_model(model, name, device, args, budget)
+        if best is None:
+            print(f'{name}: no candidate fit in {budget / 1024 ** 3:.1f}GB')
+            continue
+
+        print(f'{name}: best cropsize {best["cropsize"]} padding {best["padding"]} batchsize {best["batchsize"]} at {best["frames_per_second"]:.0f} frames/s')
+        entries[autotune.profile_key(device, name, args.precision, args.quantize)] = { **best, 'tuned': time.strftime('%Y-%m-%dT%H:%M:%S') }
+
+    autotune.save_profile(path, entries)
+    print(f'\nwrote {len(entries)} settings to {path}')
+
+if __name__ == '__main__':
+    main()
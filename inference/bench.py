@@ -0,0 +1,203 @@
+import copy
+import itertools
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import soundfile as sf
+import torch
+
+import inference
+from lib import registry
+from lib import spec_utils
+
+STAGES = ['stft', 'model', 'istft', 'write']
+
+def peak_rss():
+    # process lifetime peak in bytes; resource is unix only (kilobytes on linux, bytes on macos), windows reports its
+    # peak working set through psutil when that's installed
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return 0
+
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+class RssSampler(object):
+    # peak resident memory while a config runs; ru_maxrss only ever grows so it can't isolate one config
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self.running = False
+        self.thread = None
+
+    def _current(self):
+        try:
+            with open('/proc/self/statm', 'r') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError):
+            # no procfs, fall back to the process lifetime peak
+            return peak_rss()
+
+    def _run(self):
+        while self.running:
+            self.peak = max(self.peak, self._current())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self._current()
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self._current())
+
+def synthetic_wave(seconds, sr, seed=0):
+    # a few detuned harmonic tones per channel over pink-ish noise, so masks aren't trivially all zero or one
+    rng = np.random.RandomState(seed)
+    t = np.arange(int(seconds * sr), dtype=np.float32) / sr
+    wave = np.zeros((2, len(t)), dtype=np.float32)
+
+    for channel in range(2):
+        for f0 in rng.uniform(80, 800, size=4):
+            for harmonic in range(1, 6):
+                wave[channel] += np.sin(2 * np.pi * f0 * harmonic * t + rng.uniform(0, 2 * np.pi)).astype(np.float32) / (harmonic * 8)
+
+        noise = rng.randn(len(t)).astype(np.float32)
+        wave[channel] += np.cumsum(noise) / np.sqrt(len(t)) * 0.05 + noise * 0.02
+
+    return wave / np.abs(wave).max()
+
+def with_config(args, cropsize, padding, batchsize):
+    args = copy.copy(args)
+    args.cropsize = cropsize
+    args.padding = padding
+    args.batchsize = batchsize
+
+    return args
+
+def run_config(X, models, names, device, args, output_dir):
+    args = copy.copy(args)
+    args.models = names
+    timer = inference.StageTimer()
+
+    if device.type == 'cuda':
+        torch.cuda.reset_peak_memory_stats(device)
+
+    start = time.perf_counter()
+    with RssSampler() as rss:
+        with timer('stft'):
+            X_spec = spec_utils.wave_to_spectrogram(X, args.hop_length, 2048)
+
+        with timer('model'):
+            y_spec, _ = inference.separate_track(X_spec, models, device, args, timer=timer)
+
+        with timer('istft'):
+            wave = spec_utils.spectrogram_to_wave(y_spec, hop_length=args.hop_length)
+
+        with timer('write'):
+            sf.write(os.path.join(output_dir, f'bench.{args.output_format}'), wave.T, args.sr)
+
+    wall = time.perf_counter() - start
+    duration = X.shape[1] / args.sr
+
+    return {
+        'wall_seconds': round(wall, 3),
+        'rtf': round(wall / duration, 4),
+        'stage_seconds': { stage: round(timer.totals.get(stage, 0), 3) for stage in STAGES },
+        'model_rtf': round(timer.totals.get('model', 0) / duration, 4),
+        'crops': timer.crops,
+        'skipped_crops': timer.skipped_crops,
+        'peak_rss_mb': round(rss.peak / 1024 ** 2, 1),
+        'peak_cuda_mb': round(torch.cuda.max_memory_allocated(device) / 1024 ** 2, 1) if device.type == 'cuda' else None
+    }
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--lengths', type=str, default='30,180') # seconds of synthetic audio
+    p.add_argument('--cropsizes', type=str, default='')  # comma separated, defaults to --cropsize
+    p.add_argument('--batchsizes', type=str, default='') # defaults to --batchsize
+    p.add_argument('--paddings', type=str, default='')   # defaults to --padding
+    p.add_argument('--model_sets', type=str, default='') # semicolon separated ensembles, e.g. "v10;v7,v8,v10", defaults to --models
+    p.add_argument('--repeat', type=int, default=1) # runs per config, the fastest is kept
+    p.add_argument('--warmup', action='store_true') # run the first config once untimed so cudnn/allocator setup isn't charged to it
+    p.add_argument('--bench_output', type=str, default='bench.json')
+    args = p.parse_args()
+
+    ints = lambda s, default: [int(v) for v in s.split(',')] if s != '' else [default]
+    lengths = [float(v) for v in args.lengths.split(',')]
+    cropsizes = ints(args.cropsizes, args.cropsize)
+    batchsizes = ints(args.batchsizes, args.batchsize)
+    paddings = ints(args.paddings, args.padding)
+    model_sets = [s.split(',') for s in args.model_sets.split(';')] if args.model_sets != '' else [args.models.split(',')]
+
+    args.output_format = args.output_format.lower()
+    args.mask_cache = ''
+    args.stream = False
+    args.postprocess = False
+    args.autotune = 'off' # the sweep sets cropsize/padding/batchsize itself
+
+    # every model any set needs is loaded once and shared between sets
+    args.models = [m for m in registry.MODELS if any(m in s for s in model_sets)]
+    device, models, _ = inference.load_models(args)
+    loaded = dict(zip(args.models, models))
+
+    configs = list(itertools.product(lengths, [','.join(s) for s in model_sets], cropsizes, paddings, batchsizes))
+    results = []
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        waves = { length: synthetic_wave(length, args.sr, args.seed) for length in lengths }
+
+        if args.warmup:
+            length, names, cropsize, padding, batchsize = configs[0]
+            names = names.split(',')
+            run_config(waves[length][:, :args.sr * 5], [loaded[n] for n in names], names, device, with_config(args, cropsize, padding, batchsize), output_dir)
+
+        for length, names, cropsize, padding, batchsize in configs:
+            print(f'\n{length:g}s  models {names}  cropsize {cropsize}  padding {padding}  batchsize {batchsize}')
+            names = names.split(',')
+            config_args = with_config(args, cropsize, padding, batchsize)
+
+            runs = [run_config(waves[length], [loaded[n] for n in names], names, device, config_args, output_dir) for _ in range(args.repeat)]
+            best = min(runs, key=lambda r: r['wall_seconds'])
+            results.append({ 'seconds': length, 'models': ','.join(names), 'cropsize': cropsize, 'padding': padding, 'batchsize': batchsize, **best })
+
+            print(f'rtf {best["rtf"]:.3f}  model rtf {best["model_rtf"]:.3f}  ' + '  '.join(f'{s} {best["stage_seconds"][s]:.2f}s' for s in STAGES) + f'  peak rss {best["peak_rss_mb"]:.0f}MB')
+
+    report = {
+        'environment': {
+            'torch': torch.__version__,
+            'device': str(device),
+            'cuda_device': torch.cuda.get_device_name(device) if device.type == 'cuda' else None,
+            'cpu_count': os.cpu_count(),
+            'torch_threads': torch.get_num_threads(),
+            'platform': platform.platform(),
+            'python': platform.python_version()
+        },
+        'settings': { 'sr': args.sr, 'hop_length': args.hop_length, 'precision': args.precision, 'quantize': args.quantize, 'tta': [args.tta_scales, args.tta_swap] if args.tta else None, 'overlap_hop': args.overlap_hop, 'silence_threshold': args.silence_threshold, 'vocal_gate': args.vocal_gate_threshold if args.vocal_gate != '' else None, 'output_format': args.output_format, 'repeat': args.repeat },
+        'results': results
+    }
+
+    with open(args.bench_output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print(f'\nwrote {len(results)} results to {args.bench_output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import argparse
+import json
+import os
+import time
+
+import librosa
+import numpy as np
+
+from lib import audio_io
+
+def decode_librosa(path, sr):
+    # the decode every loader used before audio_io
+    X, _ = librosa.load(path, sr=sr, mono=False, dtype=np.float32, res_type='kaiser_fast')
+    return X
+
+def decode_audio_io(path, sr):
+    X, _ = audio_io.load(path, sr)
+    return X
+
+def decode_stream(path, sr):
+    return np.concatenate(list(audio_io.stream(path, sr)), axis=1)
+
+def time_decode(decode, path, sr, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        X = decode(path, sr)
+        seconds.append(time.perf_counter() - start)
+
+    return float(np.median(seconds)), X
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--input', '-i', required=True) # folder of wav/flac/mp3/... files
+    p.add_argument('--sr', '-r', type=int, default=44100)
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--bench_output', type=str, default='')
+    args = p.parse_args()
+
+    extensions = ['wav', 'flac', 'mp3', 'ogg', 'm4a', 'mp4']
+    files = sorted([os.path.join(args.input, f) for f in os.listdir(args.input) if os.path.splitext(f)[1][1:].lower() in extensions])
+
+    rows = []
+    for file in files:
+        file_info = audio_io.info(file)
+        librosa_seconds, reference = time_decode(decode_librosa, file, args.sr, args.repeat)
+        audio_io_seconds, X = time_decode(decode_audio_io, file, args.sr, args.repeat)
+        stream_seconds, _ = time_decode(decode_stream, file, args.sr, args.repeat)
+
+        n = min(reference.shape[-1], X.shape[-1])
+        rows.append({
+            'file': file,
+            'format': os.path.splitext(file)[1][1:].lower(),
+            'path': 'fallback' if file_info is None else ('resample' if file_info.samplerate != args.sr else 'native'),
+            'duration': reference.shape[-1] / args.sr,
+            'librosa_seconds': librosa_seconds,
+            'audio_io_seconds': audio_io_seconds,
+            'stream_seconds': stream_seconds,
+            'speedup': librosa_seconds / audio_io_seconds,
+            'samples_differ': int(reference.shape[-1] - X.shape[-1]),
+            'max_abs_diff': float(np.max(np.abs(reference[..., :n] - X[..., :n]))) if n > 0 else 0.0
+        })
+
+    print(f'{"format":<7} {"path":<9} {"files":>6} {"librosa":>9} {"audio_io":>9} {"stream":>9} {"speedup":>8} {"max diff":>9}')
+    for fmt in sorted(set((r['format'], r['path']) for r in rows)):
+        group = [r for r in rows if (r['format'], r['path']) == fmt]
+        librosa_seconds = sum(r['librosa_seconds'] for r in group)
+        audio_io_seconds = sum(r['audio_io_seconds'] for r in group)
+        stream_seconds = sum(r['stream_seconds'] for r in group)
+        print(f'{fmt[0]:<7} {fmt[1]:<9} {len(group):6d} {librosa_seconds:8.2f}s {audio_io_seconds:8.2f}s {stream_seconds:8.2f}s {librosa_seconds / audio_io_seconds:7.2f}x {max(r["max_abs_diff"] for r in group):9.2e}')
+
+    if args.bench_output != '':
+        with open(args.bench_output, 'w') as f:
+            json.dump({ 'sr': args.sr, 'repeat': args.repeat, 'results': rows }, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
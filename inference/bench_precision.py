@@ -0,0 +1,85 @@
+import copy
+import json
+import time
+
+import numpy as np
+import torch
+
+import inference
+from quantize import list_files, model_names
+
+def separate_masks(files, args, precision):
+    args = copy.copy(args)
+    args.precision = precision
+    device, models, _ = inference.load_models(args)
+
+    masks = {}
+    seconds = {}
+    frames = 0
+    for file in files:
+        X_spec, _, _ = inference.load_track(file, args)
+        X_mag = np.abs(X_spec)
+        frames += X_mag.shape[2]
+
+        for name, model in zip(model_names(args), models):
+            sp = inference.Separator(model, device, args.batchsize, args.cropsize, 2048, autoregressive=model.autoregressive, precision=precision)
+
+            start = time.perf_counter()
+            masks[(file, name)] = sp.separate_mask(X_mag, padding=args.padding)
+            seconds[name] = seconds.get(name, 0) + time.perf_counter() - start
+
+    return masks, seconds, frames
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--input', '-i', required=True) # track or folder of tracks to benchmark on
+    p.add_argument('--precisions', type=str, default='fp32,bf16,fp16')
+    p.add_argument('--report_output', type=str, default='') # also write the results as json
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+    args.mask_cache = ''
+    args.stream = False
+    args.autotune = 'off'
+
+    files = list_files(args.input)
+    precisions = [precision for precision in args.precisions.split(',')]
+    if 'fp32' not in precisions:
+        precisions = ['fp32'] + precisions
+
+    device = torch.device('cuda:{}'.format(args.gpu) if torch.cuda.is_available() and args.gpu >= 0 else 'cpu')
+    for precision in precisions[:]:
+        try:
+            inference.check_precision(device, precision)
+        except ValueError as e:
+            print(f'skipping {precision}: {e}')
+            precisions.remove(precision)
+
+    results = { precision: separate_masks(files, args, precision) for precision in precisions }
+    reference, _, _ = results['fp32']
+
+    device = 'cuda' if torch.cuda.is_available() and args.gpu >= 0 else 'cpu'
+    print(f'\n{len(files)} files on {device}, cropsize {args.cropsize}, batchsize {args.batchsize}')
+    print(f'{"model":<6} {"precision":<9} {"frames/s":>10} {"speedup":>8} {"mean err":>10} {"max err":>10}')
+
+    rows = []
+    for name in model_names(args):
+        for precision in precisions:
+            masks, seconds, frames = results[precision]
+            errors = [np.abs(masks[(f, name)] - reference[(f, name)]) for f in files]
+            row = {
+                'model': name,
+                'precision': precision,
+                'frames_per_second': frames / seconds[name],
+                'speedup': results['fp32'][1][name] / seconds[name],
+                'mean_error': float(np.mean([e.mean() for e in errors])),
+                'max_error': float(max(e.max() for e in errors))
+            }
+            rows.append(row)
+            print(f'{name:<6} {precision:<9} {row["frames_per_second"]:10.1f} {row["speedup"]:7.2f}x {row["mean_error"]:10.2e} {row["max_error"]:10.2e}')
+
+    if args.report_output != '':
+        with open(args.report_output, 'w') as f:
+            json.dump({ 'files': files, 'device': device, 'cropsize': args.cropsize, 'batchsize': args.batchsize, 'results': rows }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+# run in a fresh interpreter per sample so nothing is already imported or cached in-process
+PROBE = '''
+import json, sys, time
+def peak_rss_kb():
+    # resource is unix only, windows goes through psutil when it's installed
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 1024
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 if sys.platform == 'darwin' else maxrss
+start = time.perf_counter()
+import inference
+imported = time.perf_counter()
+p = inference.make_parser()
+p.add_argument('--build_only', action='store_true')
+args = p.parse_args(sys.argv[1:])
+args.models = args.models.split(',')
+args.autotune = 'off'
+args.mask_cache = ''
+args.stream = False
+if args.build_only:
+    from lib import registry
+    for name in registry.selected(args.models):
+        registry.build(name)
+    loaded = time.perf_counter()
+    rss_load = peak_rss_kb()
+    first_mask = None
+else:
+    import numpy as np
+    device, models, _ = inference.load_models(args)
+    loaded = time.perf_counter()
+    rss_load = peak_rss_kb()
+    X_mag = np.random.rand(2, 1025, args.cropsize).astype(np.float32)
+    for model in models:
+        inference.Separator(model, device, 1, args.cropsize, 2048, autoregressive=model.autoregressive, precision=args.precision).separate_mask(X_mag, args.padding)
+    first_mask = time.perf_counter()
+modules = sorted(m for m in sys.modules if m.split('.')[0] in ['v7', 'v8', 'v9r', 'v10', 'music_tag', 'cv2'])
+print(json.dumps({ 'import': imported - start, 'load': loaded - imported, 'first_mask': first_mask - start if first_mask is not None else None, 'rss_load_kb': rss_load, 'modules': modules }))
+'''
+
+def sample(models, args):
+    command = [sys.executable, '-c', PROBE, '--models', models] + (['--build_only'] if args.build_only else []) + args.extra
+    out = subprocess.run(command, cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--model_sets', type=str, default='v7;v8;v9;v10;v7,v8,v10') # ';' separated --models values to compare; pass --model_<name> x.safetensors to compare formats
+    p.add_argument('--repeat', type=int, default=5)
+    p.add_argument('--build_only', action='store_true') # construct the models without loading checkpoints
+    p.add_argument('--bench_output', type=str, default='')
+    args, args.extra = p.parse_known_args() # anything else goes to inference's parser, e.g. --gpu or checkpoint paths
+
+    results = []
+    for models in args.model_sets.split(';'):
+        samples = [sample(models, args) for _ in range(args.repeat)]
+        row = {
+            'models': models,
+            'import_seconds': float(np.median([s['import'] for s in samples])),
+            'load_seconds': float(np.median([s['load'] for s in samples])),
+            'first_mask_seconds': float(np.median([s['first_mask'] for s in samples])) if not args.build_only else None,
+            'peak_rss_load_mb': float(np.median([s['rss_load_kb'] for s in samples])) / 1024 if samples[0]['rss_load_kb'] is not None else None,
+            'modules': sorted(set(m.split('.')[0] for m in samples[0]['modules']))
+        }
+        results.append(row)
+        first_mask = f', first mask {row["first_mask_seconds"]:.3f}s' if row['first_mask_seconds'] is not None else ''
+        rss = f'{row["peak_rss_load_mb"]:.0f}MB' if row['peak_rss_load_mb'] is not None else 'n/a'
+        print(f'{models:<12} import {row["import_seconds"]:.3f}s, models {row["load_seconds"]:.3f}s{first_mask}, peak rss at load {rss}, model packages imported: {", ".join(row["modules"]) or "none"}')
+
+    if args.bench_output != '':
+        with open(args.bench_output, 'w') as f:
+            json.dump({ 'python': sys.version, 'repeat': args.repeat, 'results': results }, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
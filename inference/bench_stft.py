@@ -0,0 +1,72 @@
+import argparse
+import json
+import time
+
+import librosa
+import numpy as np
+
+from lib import audio_io
+from lib import spec_utils
+
+def librosa_stft(wave, hop_length, n_fft, pad_mode):
+    # the per-channel calls spec_utils made before the batched engine
+    return np.asarray([librosa.stft(np.asfortranarray(w), n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode) for w in wave])
+
+def librosa_istft(spec, hop_length):
+    return np.asarray([librosa.istft(np.asfortranarray(s), hop_length=hop_length) for s in spec])
+
+def timed(fn, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        seconds.append(time.perf_counter() - start)
+
+    return float(np.median(seconds)), result
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument('--input', '-i', type=str, default='') # track to transform, random noise when empty
+    p.add_argument('--seconds', type=float, default=240) # length of the noise clip
+    p.add_argument('--clips', type=int, default=1) # stereo clips transformed in one batched call
+    p.add_argument('--sr', '-r', type=int, default=44100)
+    p.add_argument('--hop_length', '-H', type=int, default=1024)
+    p.add_argument('--n_fft', type=int, default=2048)
+    p.add_argument('--pad_mode', type=str, default='reflect')
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--bench_output', type=str, default='')
+    args = p.parse_args()
+
+    if args.input != '':
+        wave, _ = audio_io.load_stereo(args.input, args.sr)
+    else:
+        wave = np.random.default_rng(0).uniform(-1, 1, (2, int(args.seconds * args.sr))).astype(np.float32)
+
+    waves = np.stack([wave] * args.clips)
+
+    stft_librosa, reference = timed(lambda: [librosa_stft(w, args.hop_length, args.n_fft, args.pad_mode) for w in waves], args.repeat)
+    stft_engine, spec = timed(lambda: spec_utils.stft(waves, args.hop_length, args.n_fft, pad_mode=args.pad_mode), args.repeat)
+    istft_librosa, reference_wave = timed(lambda: [librosa_istft(s, args.hop_length) for s in reference], args.repeat)
+    istft_engine, engine_wave = timed(lambda: spec_utils.istft(spec, args.hop_length), args.repeat)
+
+    reference = np.stack(reference)
+    reference_wave = np.stack(reference_wave)
+    n = min(reference_wave.shape[-1], engine_wave.shape[-1])
+
+    result = {
+        'samples': int(waves.shape[-1]),
+        'clips': args.clips,
+        'stft': { 'librosa_seconds': stft_librosa, 'engine_seconds': stft_engine, 'speedup': stft_librosa / stft_engine, 'max_abs_diff': float(np.max(np.abs(reference - spec))), 'dtype': str(spec.dtype) },
+        'istft': { 'librosa_seconds': istft_librosa, 'engine_seconds': istft_engine, 'speedup': istft_librosa / istft_engine, 'max_abs_diff': float(np.max(np.abs(reference_wave[..., :n] - engine_wave[..., :n]))), 'length_diff': int(reference_wave.shape[-1] - engine_wave.shape[-1]), 'dtype': str(engine_wave.dtype) }
+    }
+
+    for name in ['stft', 'istft']:
+        r = result[name]
+        print(f'{name:<6} librosa {r["librosa_seconds"]:.3f}s, engine {r["engine_seconds"]:.3f}s ({r["speedup"]:.2f}x), max abs diff {r["max_abs_diff"]:.2e}, {r["dtype"]}')
+
+    if args.bench_output != '':
+        with open(args.bench_output, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
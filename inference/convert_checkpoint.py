@@ -0,0 +1,40 @@
+import os
+
+import torch
+
+import inference
+from lib import checkpoints
+from lib import registry
+
+def convert(name, path, output, verify):
+    # read the old way on purpose, the .pth files being converted may predate weights_only loading
+    state_dict = torch.load(path, map_location='cpu')
+    checkpoints.save_state_dict(output, state_dict, metadata={ 'model': name, 'source': os.path.basename(path) })
+    print(f'{name}: {path} -> {output} ({os.path.getsize(output) / 1024 ** 2:.1f}MB)')
+
+    if verify:
+        model = checkpoints.load_model(lambda: registry.build(name), output, 'cpu')
+        converted = model.state_dict()
+
+        mismatched = [k for k, v in state_dict.items() if k not in converted or not torch.equal(v, converted[k])]
+        if mismatched or len(converted) != len(state_dict):
+            raise ValueError(f'{output} doesn\'t match {path}: {", ".join(mismatched[:5]) or "different keys"}')
+
+        print(f'{name}: verified {len(converted)} tensors')
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--output_dir', type=str, default='') # defaults to next to each checkpoint
+    p.add_argument('--verify', action='store_true') # load each converted file into its model and compare every tensor
+    args = p.parse_args()
+
+    for name in registry.selected(args.models.split(',')):
+        path = getattr(args, f'model_{name}')
+        output = os.path.splitext(path)[0] + '.safetensors'
+        if args.output_dir != '':
+            output = os.path.join(args.output_dir, os.path.basename(output))
+
+        convert(name, path, output, args.verify)
+
+if __name__ == '__main__':
+    main()
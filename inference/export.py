@@ -0,0 +1,82 @@
+import sys
+import time
+
+import torch
+
+import inference
+from lib import artifacts
+
+def time_forward(model, x, runs):
+    with torch.no_grad():
+        # first call pays for tracing/optimization passes in the jit and session setup in onnxruntime
+        out = model(x)
+
+        if x.device.type == 'cuda':
+            torch.cuda.synchronize()
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            out = model(x)
+
+        if x.device.type == 'cuda':
+            torch.cuda.synchronize()
+
+    return torch.sigmoid(out.float()), (time.perf_counter() - start) / max(runs, 1)
+
+def check(model, artifact, device, frames, args):
+    # compares against eager on the exported frame count and, for dynamic artifacts, a second one
+    sizes = [frames] if artifact.frames is not None else [frames, frames + artifacts.FRAME_MULTIPLE * 4]
+    failed = False
+
+    print(f'{"frames":>7} {"batch":>6} {"eager ms":>10} {"artifact ms":>12} {"speedup":>8} {"max err":>10}')
+    for size in sizes:
+        x = artifacts.example_input(model, size, device, args.batchsize)
+        eager, eager_time = time_forward(model, x, args.check_runs)
+        exported, exported_time = time_forward(artifact, x, args.check_runs)
+        error = (eager - exported).abs().max().item()
+        failed = failed or error > args.tolerance
+
+        print(f'{size:>7} {args.batchsize:>6} {eager_time * 1000:10.1f} {exported_time * 1000:12.1f} {eager_time / exported_time:7.2f}x {error:10.2e}')
+
+    if failed:
+        print(f'artifact output differs from eager by more than {args.tolerance}')
+
+    return not failed
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--format', type=str.lower, choices=['torchscript', 'onnx'], default='torchscript')
+    p.add_argument('--artifact', type=str, default='model.v10.pt')
+    p.add_argument('--frames', type=int, default=0) # frame count to trace with, 0 for --cropsize + 2 * --padding
+    p.add_argument('--dynamic', action='store_true') # accept any frame count that's a multiple of 32
+    p.add_argument('--opset', type=int, default=17)
+    p.add_argument('--check', action='store_true') # compare the artifact's output and speed against eager, non-zero exit on mismatch
+    p.add_argument('--check_runs', type=int, default=5)
+    p.add_argument('--tolerance', type=float, default=1e-3) # max abs difference in the sigmoid mask
+    args = p.parse_args()
+
+    # only the v10 temporal u-net is exportable, and always in fp32
+    args.models = ['v10']
+    args.model_v10_artifact = ''
+    args.precision = 'fp32'
+    args.quantize = 'none'
+    args.attention_chunk_size = 0
+    args.attention_residual_dtype = 'fp32'
+    args.mask_cache = ''
+    args.autotune = 'off'
+
+    device, models, _ = inference.load_models(args)
+    model = models[0]
+    frames = args.frames if args.frames > 0 else args.cropsize + args.padding * 2
+
+    print(f'exporting v10 to {args.artifact} ({args.format}, {"dynamic" if args.dynamic else frames} frames)')
+    if args.format == 'torchscript':
+        artifacts.export_torchscript(model, args.artifact, frames, device, args.dynamic)
+    else:
+        artifacts.export_onnx(model, args.artifact, frames, device, args.dynamic, args.opset)
+
+    if args.check and not check(model, artifacts.load_artifact(args.artifact, device), device, frames, args):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,69 @@
 import argparse
+import contextlib
 import os
+import queue
 import shutil
-import librosa
+import threading
+import time
+import traceback
+import warnings
 import numpy as np
 import soundfile as sf
-import music_tag
 import torch
 from tqdm import tqdm
 
-from v7.libft2gan.frame_transformer4 import FrameTransformerGenerator as FrameTransformerV7
-from v8.libft2gan.frame_transformer5 import FrameTransformer as FrameTransformerV8
-from v9r.libft2gan.frame_transformer12 import FrameTransformer as FrameTransformerV9
-from v10.libft2gan.frame_transformer13 import FrameTransformer as FrameTransformerV10
-
+from lib import artifacts
+from lib import audio_io
+from lib import autotune
+from lib import checkpoints
 from lib import dataset
+from lib import ensemble
+from lib import layer_profiler
+from lib import manifest
+from lib import mask_cache
+from lib import quantization
+from lib import registry
 from lib import spec_utils
-from lib import utils
+from lib import vocal_gate
+
+def default_precision(device):
+    # cuda has always run under fp16 autocast, cpu in plain fp32
+    return 'fp16' if torch.device(device).type == 'cuda' else 'fp32'
+
+def autocast(device, precision):
+    if precision == 'fp32':
+        return contextlib.nullcontext()
+
+    dtype = { 'bf16': torch.bfloat16, 'fp16': torch.float16 }[precision]
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+def check_precision(device, precision):
+    # older torch either rejects fp16 autocast on cpu or warns and quietly runs fp32, so try a matmul under it and
+    # check it really came out in the requested dtype
+    if precision == 'fp32':
+        return
+
+    dtype = { 'bf16': torch.bfloat16, 'fp16': torch.float16 }[precision]
+    if torch.device(device).type == 'cuda' and dtype == torch.bfloat16 and not torch.cuda.is_bf16_supported():
+        raise ValueError(f'{device} does not support bf16, use --precision fp16 or fp32')
+
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+
+            with autocast(device, precision):
+                out = torch.matmul(torch.ones(2, 2, device=device), torch.ones(2, 2, device=device))
+    except (AttributeError, RuntimeError, TypeError) as e:
+        raise ValueError(f'--precision {precision} is not supported on {device} by torch {torch.__version__}: {e}')
+
+    if out.dtype != dtype:
+        raise ValueError(f'--precision {precision} is not supported on {device} by torch {torch.__version__}, it would run in {out.dtype}; use fp32{" or bf16" if torch.device(device).type == "cpu" else ""}')
 
 class Separator(object):
-    def __init__(self, model, device, batchsize, cropsize, n_fft, postprocess=False, autoregressive=False):
+    def __init__(self, model, device, batchsize, cropsize, n_fft, postprocess=False, autoregressive=False, batcher=None, precision=None, silence_threshold=0, silence_mask=1.0):
         self.model = model
+        self.precision = default_precision(device) if precision is None else precision
+        self.batcher = batcher if not autoregressive else None
         self.autoregressive = autoregressive
         self.offset = 0
         self.device = device
@@ -27,8 +71,30 @@ class Separator(object):
         self.cropsize = cropsize
         self.postprocess = postprocess
         self.n_fft = n_fft
+        self.silence_threshold = silence_threshold
+        self.silence_mask = silence_mask
+        self.crops = 0
+        self.skipped_crops = 0
+
+    def _active_crops(self, X_mag_pad, cropsize, patches, skip=None):
+        # a crop is skipped when every frame it writes is more than silence_threshold dB below the loudest frame, or is
+        # marked in skip (the vocal gate's vocal-free frames); its context is still read when a neighbouring crop runs
+        if self.autoregressive:
+            return list(range(patches))
 
-    def _separate(self, X_mag_pad, cropsize=None, padding=None):
+        idle = np.zeros(patches, dtype=bool)
+
+        if self.silence_threshold > 0:
+            energy = np.mean(np.square(X_mag_pad[:, :, :patches * cropsize]), axis=(0, 1))
+            floor = energy.max() * 10 ** (-self.silence_threshold / 10)
+            idle |= ~(energy > floor).reshape(patches, cropsize).any(axis=1)
+
+        if skip is not None:
+            idle |= skip[:patches * cropsize].reshape(patches, cropsize).all(axis=1)
+
+        return [i for i in range(patches) if not idle[i]]
+
+    def _separate(self, X_mag_pad, cropsize=None, padding=None, skip=None):
         X_dataset = []
         cropsize = self.cropsize if cropsize is None else cropsize
         padding = cropsize // 2 if padding is None else padding
@@ -39,65 +105,123 @@ class Separator(object):
             padding = 0
 
         patches = X_mag_pad.shape[2] // cropsize
+        active = self._active_crops(X_mag_pad, cropsize, patches, skip)
         X_mag_pad = np.pad(X_mag_pad, ((0, 0), (0, 0), (padding, padding)), mode='constant')
-        for i in range(patches):
+        for i in active:
             start = (i * cropsize) + padding
             X_mag_crop = X_mag_pad[:, :, (start - padding):(start + cropsize + padding)]
             X_dataset.append(X_mag_crop)
 
         self.model.eval()
+        self._reset(cropsize + padding * 2)
 
-        with torch.no_grad():
-            mask = []
-
-            if self.autoregressive:
-                PX = torch.zeros(1, 2, self.n_fft // 2, cropsize + padding * 2).to(self.device)
-                PY = torch.zeros(1, 2, self.n_fft // 2, cropsize + padding * 2).to(self.device)
-                PX2 = torch.zeros(1, 2, self.n_fft // 2, cropsize + padding * 2).to(self.device)
-                PY2 = torch.zeros(1, 2, self.n_fft // 2, cropsize + padding * 2).to(self.device)
-
-                for i in tqdm(range(0, patches)):
-                    X_batch = X_dataset[i: i + 1]
-                    X_batch = torch.from_numpy(np.asarray(X_batch)).to(self.device)[:, :, :(self.n_fft // 2)]
-                    X_batch_1 = torch.cat((X_batch, PX, PY, PX2, PY2), dim=1)
-                    
-                    with torch.cuda.amp.autocast_mode.autocast(enabled=True):
-                        mask_pred = torch.sigmoid(self.model(X_batch_1))
-
-                    PX2 = PX
-                    PY2 = PY
-                    PX = X_batch_1[:, :2]
-                    PY = X_batch_1[:, :2] * mask_pred
-                        
-                    if padding > 0:
-                        pred = mask_pred[:, :, :, (padding):-(padding)]
-                    else:
-                        pred = mask_pred
-
-                    pred = pred.detach().cpu().numpy()
-                    pred = np.concatenate(pred, axis=2)
-                    mask.append(pred)
-            else:
-                for i in tqdm(range(0, patches, self.batchsize)):
-                    X_batch = X_dataset[i: i + self.batchsize]
-                    X_batch = torch.from_numpy(np.asarray(X_batch)).to(self.device)[:, :, :(self.n_fft // 2)]
+        # one extra bin row so the mask lines up with the 1025 bin spectrogram without another copy
+        mask = np.zeros((2, self.n_fft // 2 + 1, patches * cropsize), dtype=np.float32)
 
-                    with torch.cuda.amp.autocast_mode.autocast(enabled=True):
-                        pred = torch.sigmoid(self.model(X_batch))
+        self.crops += patches
+        self.skipped_crops += patches - len(active)
+        if len(active) < patches:
+            print(f'skipping {patches - len(active)} of {patches} crops ({(patches - len(active)) / patches * 100:.0f}% of the model compute)')
 
-                    if padding > 0:
-                        pred = pred[:, :, :, (padding):-(padding)]
+            for i in set(range(patches)) - set(active):
+                mask[:, :-1, i * cropsize:(i + 1) * cropsize] = self.silence_mask
 
-                    pred = pred.detach().cpu().numpy()
-                    pred = np.concatenate(pred, axis=2)
-                    mask.append(pred)
+        with torch.no_grad():
+            # a shared batcher does its own packing alongside other tracks' patches, so hand it everything at once
+            batchsize = self.batchsize if self.batcher is None else max(len(active), 1)
 
-            mask = np.concatenate(mask, axis=2)
+            for i in tqdm(range(0, len(active), batchsize)):
+                pred = self._predict(X_dataset[i: i + batchsize], padding)
 
-        mask = np.pad(mask, ((0,0), (0,1), (0, 0)))
+                for j, p in zip(active[i: i + batchsize], pred):
+                    mask[:, :-1, j * cropsize:(j + 1) * cropsize] = p
 
         return mask
 
+    def separate_mask_overlap(self, X_mag, hop):
+        # crops of --cropsize every hop frames, crossfaded with a hann window and normalized by the summed weights;
+        # hop == cropsize is the old hard-seamed tiling, smaller hops trade cropsize / hop times the compute for smoother seams
+        n_frame = X_mag.shape[2]
+        width = self.cropsize
+        hop = min(hop, width)
+
+        # enough lead-in that the first real frame isn't only seen by the faded edge of a single crop
+        pad_l = width - hop
+        patches = -(-(n_frame + pad_l) // hop)
+        total = (patches - 1) * hop + width
+        X_mag_pad = np.pad(X_mag / X_mag.max(), ((0, 0), (0, 0), (pad_l, total - pad_l - n_frame)), mode='constant')
+
+        window = np.hanning(width + 2)[1:-1].astype(np.float32)
+        mask = np.zeros((2, self.n_fft // 2, total), dtype=np.float32)
+        weight = np.zeros(total, dtype=np.float32)
+
+        self.model.eval()
+        self._reset(width)
+
+        with torch.no_grad():
+            batchsize = self.batchsize if self.batcher is None else max(patches, 1)
+
+            for i in tqdm(range(0, patches, batchsize)):
+                starts = [j * hop for j in range(i, min(i + batchsize, patches))]
+                pred = self._predict([X_mag_pad[:, :, start:start + width] for start in starts], 0)
+
+                for start, p in zip(starts, pred):
+                    mask[:, :, start:start + width] += p * window
+                    weight[start:start + width] += window
+
+        mask = mask[:, :, pad_l:pad_l + n_frame] / weight[pad_l:pad_l + n_frame]
+
+        return np.pad(mask, ((0, 0), (0, 1), (0, 0)))
+
+    def _reset(self, cropsize):
+        if self.autoregressive:
+            self.PX = torch.zeros(1, 2, self.n_fft // 2, cropsize).to(self.device)
+            self.PY = torch.zeros(1, 2, self.n_fft // 2, cropsize).to(self.device)
+            self.PX2 = torch.zeros(1, 2, self.n_fft // 2, cropsize).to(self.device)
+            self.PY2 = torch.zeros(1, 2, self.n_fft // 2, cropsize).to(self.device)
+
+    def _forward(self, X_batch):
+        X_batch = torch.from_numpy(np.asarray(X_batch)).to(self.device)[:, :, :(self.n_fft // 2)]
+
+        with torch.no_grad():
+            with autocast(self.device, self.precision):
+                pred = torch.sigmoid(self.model(X_batch).float())
+
+        return pred.detach().cpu().numpy()
+
+    def _predict(self, X_batch, padding):
+        if not self.autoregressive:
+            pred = self._forward(X_batch) if self.batcher is None else self.batcher(X_batch)
+
+            if padding > 0:
+                pred = pred[:, :, :, (padding):-(padding)]
+
+            return pred
+
+        X_batch = torch.from_numpy(np.asarray(X_batch)).to(self.device)[:, :, :(self.n_fft // 2)]
+
+        # each patch is conditioned on the previous two, so they have to run one at a time
+        with torch.no_grad():
+            pred = []
+            for i in range(X_batch.shape[0]):
+                X_batch_1 = torch.cat((X_batch[i:i + 1], self.PX, self.PY, self.PX2, self.PY2), dim=1)
+
+                with autocast(self.device, self.precision):
+                    mask_pred = torch.sigmoid(self.model(X_batch_1).float())
+
+                self.PX2 = self.PX
+                self.PY2 = self.PY
+                self.PX = X_batch_1[:, :2]
+                self.PY = X_batch_1[:, :2] * mask_pred
+                pred.append(mask_pred)
+
+            pred = torch.cat(pred, dim=0)
+
+        if padding > 0:
+            pred = pred[:, :, :, (padding):-(padding)]
+
+        return pred.detach().cpu().numpy()
+
     def _preprocess(self, X_spec):
         X_mag = np.abs(X_spec)
         X_phase = np.angle(X_spec)
@@ -114,49 +238,552 @@ class Separator(object):
 
         return y_spec, v_spec, m_spec
 
-    def separate(self, X_spec, padding=None):
-        X_mag, X_phase = self._preprocess(X_spec)
+    def separate_mask(self, X_mag, padding=None, skip=None):
         n_frame = X_mag.shape[2]
         pad_l, pad_r, _ = dataset.make_padding(n_frame, self.cropsize, 0)
         xm = X_mag / X_mag.max()
         X_mag_pad = np.pad(xm, ((0, 0), (0, 0), (pad_l, pad_r)), mode='constant')
-        mask = self._separate(X_mag_pad, self.cropsize, padding)
+        skip = np.pad(skip, (pad_l, pad_r), constant_values=True) if skip is not None else None
+        mask = self._separate(X_mag_pad, self.cropsize, padding, skip)
+
+        return mask[:, :, :n_frame]
 
-        mask = mask[:, :, :n_frame]
+    def separate(self, X_spec, padding=None):
+        X_mag, X_phase = self._preprocess(X_spec)
+        mask = self.separate_mask(X_mag, padding)
         y_spec, v_spec, m_spec = self._postprocess(mask, X_mag, X_phase)
 
         return y_spec, v_spec, m_spec
 
-    def separate_tta(self, X_spec, cropsizes=[64, 128, 256, 512, 1024], paddings=[128, 256, 512, 1024, 2048]):
-        X_mag, X_phase = self._preprocess(X_spec)
+    def tta_views(self, scales=3, swap=False):
+        # every view feeds the model crops of the same width so patches from all of them can share batches;
+        # scale k keeps the centre 1/2^k of each crop and spends the rest on context
+        width = self.cropsize
+        views = []
+
+        for k in range(scales):
+            padding = (width - max(width >> k, 1)) // 2
+            views.append((width - padding * 2, padding, False))
+
+            if swap:
+                views.append((width - padding * 2, padding, True))
 
+        return views
+
+    def separate_mask_tta(self, X_mag, scales=3, swap=False):
         n_frame = X_mag.shape[2]
-        X_mag_pad1 = X_mag / X_mag.max()
+        width = self.cropsize
+        views = self.tta_views(scales, swap)
+
+        # pad once for the view with the most context instead of re-padding the track per scale
+        max_padding = max(padding for _, padding, _ in views)
+        X_mag_pad = np.pad(X_mag / X_mag.max(), ((0, 0), (0, 0), (max_padding, width)), mode='constant')
+
+        patches = [(view, i) for view in views for i in range(-(-n_frame // view[0]))]
+        single_pass = -(-n_frame // width)
+        print(f'tta: {len(views)} views, {len(patches)} patches, {len(patches) / single_pass:.1f}x a single pass')
+
+        mask = np.zeros((2, self.n_fft // 2, n_frame), dtype=np.float32)
 
-        mask = np.zeros_like(X_mag)
+        self.model.eval()
+        self._reset(width)
+
+        with torch.no_grad():
+            # as in _separate, a shared batcher gets every view's patches at once and packs them itself
+            batchsize = self.batchsize if self.batcher is None else max(len(patches), 1)
+
+            for b in tqdm(range(0, len(patches), batchsize)):
+                batch = patches[b:b + batchsize]
+                X_batch = []
+
+                for (centre, padding, swapped), i in batch:
+                    start = max_padding + i * centre - padding
+                    X_crop = X_mag_pad[:, :, start:start + width]
+                    X_batch.append(X_crop[::-1] if swapped else X_crop)
 
-        for idx in range(len(paddings)):
-            pad_l, pad_r, _ = dataset.make_padding(n_frame, paddings[idx], 0)
-            X_mag_pad2 = np.pad(X_mag_pad1, ((0, 0), (0, 0), (pad_l, pad_r)), mode='constant')
-            mask += self._separate(X_mag_pad2, cropsizes[idx], paddings[idx])[:, :, :n_frame]
+                pred = self._predict(X_batch, 0)
 
-        mask = mask / len(paddings)
+                # accumulated in place, one view at a time covers every frame exactly once
+                for ((centre, padding, swapped), i), p in zip(batch, pred):
+                    start = i * centre
+                    end = min(start + centre, n_frame)
+                    p = p[::-1] if swapped else p
+                    mask[:, :, start:end] += p[:, :, padding:padding + end - start]
 
+        mask /= len(views)
+
+        return np.pad(mask, ((0, 0), (0, 1), (0, 0)))
+
+    def separate_tta(self, X_spec, scales=3, swap=False):
+        X_mag, X_phase = self._preprocess(X_spec)
+        mask = self.separate_mask_tta(X_mag, scales, swap)
         y_spec, v_spec, m_spec = self._postprocess(mask, X_mag, X_phase)
 
         return y_spec, v_spec, m_spec
 
-def main():
+def separate_stream(separators, file, sr, hop_length, n_fft, padding, block_size, inst_file, vocal_file=None, method='min', weights=None):
+    # first pass only measures the track so the normalization matches Separator.separate
+    X_max = 0
+    n_frame = 0
+    for X_spec in spec_utils.stream_spectrogram(spec_utils.stream_wave(file, sr, block_size), hop_length, n_fft):
+        X_max = max(X_max, np.abs(X_spec).max())
+        n_frame += X_spec.shape[2]
+
+    cropsize = separators[0].cropsize
+    if padding is None:
+        padding = cropsize // 2
+
+    for sp in separators:
+        if sp.autoregressive and padding > 0:
+            raise ValueError('streaming an autoregressive model requires --padding 0')
+
+        if sp.postprocess:
+            print('postprocess needs the full mask and is skipped when streaming')
+
+        sp.model.eval()
+        sp._reset(cropsize + padding * 2)
+
+    inst_istft = spec_utils.StreamingISTFT(hop_length, n_fft)
+    inst_writer = sf.SoundFile(inst_file, 'w', sr, 2)
+    vocal_istft = spec_utils.StreamingISTFT(hop_length, n_fft) if vocal_file is not None else None
+    vocal_writer = sf.SoundFile(vocal_file, 'w', sr, 2) if vocal_file is not None else None
+
+    def run_batch(batch):
+        X_crops = [X_crop for X_crop, _ in batch]
+        masks = [sp._predict(X_crops, padding) for sp in separators]
+
+        for i, (_, X_center) in enumerate(batch):
+            width = X_center.shape[2]
+            y_mask = np.pad(ensemble.reduce_masks([mask[i] for mask in masks], method, weights), ((0, 0), (0, 1), (0, 0)))[:, :, :width]
+            inst_writer.write(inst_istft(y_mask * X_center).T)
+
+            if vocal_writer is not None:
+                # matches the non-streaming ensemble, vocals are the complement of the ensembled instruments
+                vocal_writer.write(vocal_istft((1 - y_mask) * X_center).T)
+
+    spectra = spec_utils.stream_spectrogram(spec_utils.stream_wave(file, sr, block_size), hop_length, n_fft)
+    frames = np.zeros((2, n_fft // 2 + 1, 0), dtype=np.complex64)
+    offset = 0
+    batch = []
+    patches = -(-n_frame // cropsize)
+
+    for i in tqdm(range(patches)):
+        start = i * cropsize
+        end = min(start + cropsize, n_frame)
+
+        while offset + frames.shape[2] < min(end + padding, n_frame):
+            frames = np.concatenate((frames, next(spectra)), axis=2)
+
+        # zero context outside the track, as with the padding used by Separator._separate
+        X_crop = np.zeros((2, n_fft // 2 + 1, cropsize + padding * 2), dtype=np.float32)
+        s = max(start - padding, 0)
+        e = min(end + padding, n_frame)
+        X_crop[:, :, s - (start - padding):e - (start - padding)] = np.abs(frames[:, :, s - offset:e - offset]) / X_max
+        batch.append((X_crop, frames[:, :, start - offset:end - offset].copy()))
+
+        keep = max(end - padding - offset, 0)
+        frames = frames[:, :, keep:]
+        offset += keep
+
+        if len(batch) == separators[0].batchsize or i == patches - 1:
+            run_batch(batch)
+            batch = []
+
+    inst_writer.write(inst_istft.flush().T)
+    inst_writer.close()
+
+    if vocal_writer is not None:
+        vocal_writer.write(vocal_istft.flush().T)
+        vocal_writer.close()
+
+    return max(n_frame - 1, 0) * hop_length / sr
+
+def set_attention_chunking(model, query_chunk_size=None, residual_dtype=None):
+    # only attention modules that support blocked scores (v10) expose query_chunk_size
+    for module in model.modules():
+        if hasattr(module, 'query_chunk_size'):
+            module.query_chunk_size = query_chunk_size
+            module.residual_dtype = residual_dtype
+
+def copy_tags(src, dst, suffix=''):
+    # only needed once a track is written, so it stays out of startup
+    import music_tag
+
+    filetags = music_tag.load_file(src)
+    tags = music_tag.load_file(dst)
+    tags['tracktitle'] = f'{filetags["tracktitle"]}{suffix}' if suffix else filetags['tracktitle']
+    tags['album'] = f'{filetags["album"]}{suffix}' if suffix else filetags['album']
+    tags['artist'] = filetags['artist']
+    tags['tracknumber'] = filetags['tracknumber']
+    tags['totaltracks'] = filetags['totaltracks']
+    tags['year'] = filetags['year']
+    tags.save()
+
+class StageTimer(object):
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+        self.crops = 0
+        self.skipped_crops = 0
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def __call__(self, stage):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+
+            with self.lock:
+                self.totals[stage] = self.totals.get(stage, 0) + elapsed
+                self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def add_crops(self, crops, skipped_crops):
+        with self.lock:
+            self.crops += crops
+            self.skipped_crops += skipped_crops
+
+    def report(self, wall, num_files):
+        print('\nstage timings:')
+        for stage, total in self.totals.items():
+            print(f'  {stage:<10} {total:9.2f}s total, {total / self.counts[stage]:7.2f}s per file')
+
+        print(f'  sum of stages {sum(self.totals.values()):.2f}s, max stage {max(self.totals.values(), default=0):.2f}s, wall {wall:.2f}s for {num_files} files')
+
+        if self.skipped_crops > 0:
+            print(f'  skipped {self.skipped_crops} of {self.crops} crops ({self.skipped_crops / self.crops * 100:.0f}% of the model compute)')
+
+def output_paths(file, args):
+    basename = os.path.splitext(os.path.basename(file))[0]
+
+    filename_suffix = ''
+    if args.model_in_filename:
+        filename_suffix = filename_suffix.join(args.models).upper()
+
+    inst_file = f'{args.output}/{basename}_Instruments{filename_suffix}.{args.output_format}'
+    vocal_file = f'{args.output}/{basename}_Vocals{filename_suffix}.{args.output_format}'
+
+    return inst_file, vocal_file
+
+def load_track(file, args, cache=None):
+    print('\nloading wave source...', end=' ')
+    X, sr = audio_io.load_stereo(file, args.sr)
+    print('done')
+
+    # masks are cached by decoded content so retagging or re-encoding a file doesn't invalidate them
+    audio_hash = mask_cache.array_hash(X) if cache is not None else None
+
+    print('stft of wave source...', end=' ')
+    X_spec = spec_utils.wave_to_spectrogram(X, args.hop_length, 2048)
+    print('done')
+
+    return X_spec, sr, audio_hash
+
+def model_settings(model, args):
+    # cropsize, padding and batchsize from the autotune profile where load_models found one, else the command line
+    tuned = getattr(model, 'tuned', {})
+    return tuned.get('cropsize', args.cropsize), tuned.get('padding', args.padding), tuned.get('batchsize', args.batchsize)
+
+def separate_track(X_spec, models, device, args, cache=None, audio_hash=None, batchers=None, timer=None):
+    X_mag = np.abs(X_spec)
+    reducer = ensemble.MaskReducer(args.ensemble, args.ensemble_weights)
+    gate = getattr(models[0], 'vocal_gate', None)
+    free = None
+
+    for i, model in enumerate(models):
+        cropsize, padding, batchsize = model_settings(model, args)
+        sp = Separator(model, device, batchsize, cropsize, 2048, args.postprocess, model.autoregressive, batchers[i] if batchers is not None else None, args.precision, args.silence_threshold, args.silence_mask)
+        mask = None
+
+        if cache is not None:
+            key = cache.key(audio=audio_hash, checkpoint=model.checkpoint_hash, sr=args.sr, hop_length=args.hop_length, cropsize=cropsize, padding=padding, residual_dtype=args.attention_residual_dtype, quantize=args.quantize, precision=args.precision, tta=[args.tta_scales, args.tta_swap] if args.tta else None, overlap_hop=args.overlap_hop, silence=[args.silence_threshold, args.silence_mask] if args.silence_threshold > 0 else None, vocal_gate=[args.vocal_gate, args.vocal_gate_threshold, args.vocal_gate_frames] if free is not None else None)
+            mask = cache.get(key)
+
+        if mask is None:
+            if args.tta and not model.autoregressive:
+                mask = sp.separate_mask_tta(X_mag, args.tta_scales, args.tta_swap)
+            elif args.overlap_hop > 0 and not model.autoregressive:
+                mask = sp.separate_mask_overlap(X_mag, args.overlap_hop)
+            else:
+                mask = sp.separate_mask(X_mag, padding=padding, skip=free)
+
+            if cache is not None:
+                mask = cache.put(key, mask)
+
+            if timer is not None:
+                timer.add_crops(sp.crops, sp.skipped_crops)
+
+        if gate is not None and i == 0:
+            free = gate.vocal_free(X_mag / X_mag.max(), mask[:, :-1])
+            print(f'vocal gate: {free.mean() * 100:.0f}% of frames vocal-free')
+
+        if args.postprocess:
+            # merge_artifacts works in place and cache hits are read-only float16 maps
+            mask = spec_utils.merge_artifacts(np.require(mask, np.float32, 'W'))
+
+        reducer.add(mask)
+        del mask
+
+    # vocals are the complement of the ensembled instruments; the min ensemble's vocals are the max over models
+    mask = reducer.result()
+    if free is not None:
+        mask[:, :, free] = 1
+
+    y_spec = mask * X_spec
+    v_spec = (1 - mask) * X_spec
+
+    return y_spec, v_spec
+
+def temp_path(path):
+    # hidden sibling with the real extension kept last so soundfile and music_tag still recognise the format
+    directory, name = os.path.split(path)
+    root, ext = os.path.splitext(name)
+
+    return os.path.join(directory, f'.{root}.{os.getpid()}.{threading.get_ident()}.tmp{ext}')
+
+def write_track(file, y_spec, v_spec, sr, inst_file, vocal_file, args, cover=''):
+    print('\ninverse stft of instruments...', end=' ')
+    wave = spec_utils.spectrogram_to_wave(y_spec, hop_length=args.hop_length)
+    print('done')
+    sf.write(temp_path(inst_file), wave.T, sr)
+    duration = wave.shape[-1] / args.sr
+
+    if args.create_vocals:
+        print('\ninverse stft of vocals...', end=' ')
+        wave = spec_utils.spectrogram_to_wave(v_spec, hop_length=args.hop_length)
+        print('done')
+        sf.write(temp_path(vocal_file), wave.T, sr)
+
+    finish_track(file, inst_file, vocal_file, duration, args, cover)
+
+def finish_track(file, inst_file, vocal_file, duration, args, cover=''):
+    # outputs were written to temp_path and only replace the real files once tagged, so a crash never leaves a partial output
+    copy_tags(file, temp_path(inst_file))
+    os.replace(temp_path(inst_file), inst_file)
+
+    if args.create_vocals:
+        copy_tags(file, temp_path(vocal_file), ' (Vocals)')
+        os.replace(temp_path(vocal_file), vocal_file)
+
+    if args.create_webm:
+        basename = os.path.splitext(os.path.basename(file))[0]
+        vid_file = f'{args.output}/{basename}.mp4'
+        os.system(f'ffmpeg -y -framerate 1 -loop 1 -i "{cover}" -i "{inst_file}" -t {duration} "{vid_file}"')
+
+    if args.rename_dir:
+        os.system(f'python song-renamer.py --dir "{args.output}"')
+
+def run_pipeline(files, models, device, args, cover, timer, cache=None, done=None):
+    # decode+stft of the next file and istft+encode of the previous one overlap with separation of the current one
+    loaded = queue.Queue(maxsize=args.queue_size)
+    separated = queue.Queue(maxsize=args.queue_size)
+    stop = threading.Event()
+    errors = []
+    failed = []
+
+    # the queues are bounded, so every put and get gives up once the run is stopping rather than waiting on a stage
+    # that has already exited
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+        return None
+
+    def fail(file, e):
+        # with a manifest one bad file is recorded and skipped, without one the first error ends the run
+        if done is None:
+            errors.append(e)
+            stop.set()
+            return
+
+        traceback.print_exc()
+        done(file, None, f'{type(e).__name__}: {e}')
+        failed.append(file)
+
+    def loader():
+        try:
+            for file in files:
+                if stop.is_set():
+                    break
+
+                try:
+                    with timer('load'):
+                        X_spec, sr, audio_hash = load_track(file, args, cache)
+                except Exception as e:
+                    fail(file, e)
+                    continue
+
+                if not put(loaded, (file, X_spec, sr, audio_hash)):
+                    break
+        finally:
+            put(loaded, None)
+
+    def writer():
+        for file, y_spec, v_spec, sr in iter(lambda: get(separated), None):
+            inst_file, vocal_file = output_paths(file, args)
+
+            try:
+                with timer('write'):
+                    write_track(file, y_spec, v_spec, sr, inst_file, vocal_file, args, cover)
+            except Exception as e:
+                fail(file, e)
+                continue
+
+            if done is not None:
+                done(file, (inst_file, vocal_file if args.create_vocals else None))
+
+    threads = [threading.Thread(target=loader, daemon=True), threading.Thread(target=writer, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for file, X_spec, sr, audio_hash in tqdm(iter(lambda: get(loaded), None), total=len(files)):
+            try:
+                with timer('separate'):
+                    y_spec, v_spec = separate_track(X_spec, models, device, args, cache, audio_hash, timer=timer)
+            except Exception as e:
+                fail(file, e)
+                continue
+
+            if not put(separated, (file, y_spec, v_spec, sr)):
+                break
+    except BaseException:
+        # ctrl-c or an error in this thread
+        stop.set()
+        raise
+    finally:
+        put(separated, None)
+
+        # a stopped producer may still be holding a queue slot, empty both so nothing is left waiting on them
+        if stop.is_set():
+            for q in [loaded, separated]:
+                try:
+                    while True:
+                        q.get_nowait()
+                except queue.Empty:
+                    pass
+
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    if failed:
+        print(f'{len(failed)} files failed, see {args.manifest}')
+
+def _worker(jobs, results, models, device, args, cover, cache, threads):
+    # intra-op threads are split between workers so they don't oversubscribe the cores
+    torch.set_num_threads(threads)
+    timer = StageTimer()
+
+    for file in iter(jobs.get, None):
+        try:
+            outputs = process_file(file, models, device, args, timer, cover, cache)
+            results.put(('done', file, outputs))
+        except Exception as e:
+            traceback.print_exc()
+            results.put(('failed', file, f'{type(e).__name__}: {e}'))
+
+    results.put(('exit', dict(timer.totals), dict(timer.counts), (timer.crops, timer.skipped_crops), (cache.hits, cache.misses) if cache is not None else None))
+
+def run_workers(files, models, device, args, cover, timer, cache=None, done=None):
+    if device.type != 'cpu':
+        raise ValueError('--workers is for cpu separation, a gpu is already saturated by one process')
+
+    if any(isinstance(model, artifacts.ArtifactModel) for model in models):
+        raise ValueError('exported artifacts can\'t be shared between worker processes, use the checkpoint instead')
+
+    # weights move into shared memory once and every worker maps the same pages instead of loading its own copy
+    for model in models:
+        model.share_memory()
+
+    ctx = torch.multiprocessing.get_context('spawn')
+    threads = max(1, (args.threads if args.threads > 0 else os.cpu_count()) // args.workers)
+    jobs = ctx.Queue()
+    results = ctx.Queue()
+
+    for file in files:
+        jobs.put(file)
+
+    for _ in range(args.workers):
+        jobs.put(None)
+
+    print(f'starting {args.workers} workers with {threads} threads each')
+    workers = [ctx.Process(target=_worker, args=(jobs, results, models, device, args, cover, cache, threads), daemon=True) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    errors = []
+    running = len(workers)
+
+    with tqdm(total=len(files)) as pbar:
+        while running > 0:
+            try:
+                result = results.get(timeout=1)
+            except queue.Empty:
+                if any(worker.exitcode not in [None, 0] for worker in workers):
+                    raise RuntimeError('a worker process died, see its output above')
+
+                continue
+
+            if result[0] == 'exit':
+                _, totals, counts, crops, cache_stats = result
+                running -= 1
+                timer.add_crops(*crops)
+
+                with timer.lock:
+                    for stage, total in totals.items():
+                        timer.totals[stage] = timer.totals.get(stage, 0) + total
+                        timer.counts[stage] = timer.counts.get(stage, 0) + counts[stage]
+
+                if cache_stats is not None:
+                    cache.hits += cache_stats[0]
+                    cache.misses += cache_stats[1]
+            else:
+                if result[0] == 'failed':
+                    errors.append(f'{result[1]}: {result[2]}')
+
+                if done is not None:
+                    done(result[1], result[2] if result[0] == 'done' else None, result[2] if result[0] == 'failed' else None)
+
+                pbar.update(1)
+
+    for worker in workers:
+        worker.join()
+
+    if errors and done is not None:
+        # the manifest already holds each failure, so the run ends normally like the other loops
+        print(f'{len(errors)} files failed, see {args.manifest}')
+    elif errors:
+        raise RuntimeError(f'{len(errors)} of {len(files)} files failed:\n' + '\n'.join(errors))
+
+def make_parser():
     p = argparse.ArgumentParser()
     p.add_argument('--gpu', '-g', type=int, default=-1)
 
-    p.add_argument('--model_v7', type=str, default='model.v7.pth')
-    p.add_argument('--model_v8', type=str, default='model.v8.pth')
-    p.add_argument('--model_v9', type=str, default='model.v9.pth')
-    p.add_argument('--model_v10', type=str, default='model.v10.pth')
+    for name, entry in registry.MODELS.items():
+        p.add_argument(f'--model_{name}', type=str, default=entry['checkpoint'])
+    p.add_argument('--model_v10_artifact', type=str, default='') # torchscript or onnx file from export.py, used instead of --model_v10
     p.add_argument('--models', type=str, default='v7,v8,v10')
     
-    p.add_argument('--input', '-i', required=True)
+    p.add_argument('--ensemble', type=str.lower, choices=ensemble.REDUCERS, default='min') # how the models' instrument masks are combined
+    p.add_argument('--ensemble_weights', type=str, default='') # comma separated, one per model in --models order, for --ensemble weighted
     p.add_argument('--output', '-o', type=str, default="")
     p.add_argument('--output_format', type=str, default="flac")
     p.add_argument('--sr', '-r', type=int, default=44100)
@@ -164,6 +791,15 @@ def main():
     p.add_argument('--batchsize', '-B', type=int, default=1)
     p.add_argument('--cropsize', '-c', type=int, default=4096)
     p.add_argument('--padding', type=int, default=0)
+    p.add_argument('--overlap_hop', type=int, default=0) # frames between overlap-added crops instead of padding, 0 keeps the padded tiling
+    p.add_argument('--silence_threshold', type=float, default=0) # dB below the loudest frame under which a whole crop is skipped instead of separated, 0 to separate everything
+    p.add_argument('--silence_mask', type=float, default=1.0) # instrument mask written for skipped crops
+    p.add_argument('--vocal_gate', type=str, default='', help='VocalDetector checkpoint. crops it scores vocal-free on the first model\'s mask skip the rest of the ensemble and pass through as instruments; the first model always runs in full, so this needs two or more --models')
+    p.add_argument('--vocal_gate_threshold', type=float, default=0) # vocal probability below which a crop is vocal-free, 0 for the calibrated value
+    p.add_argument('--vocal_gate_calibration', type=str, default='vocal_gate.json') # written by vocal_gate.py --calibrate
+    p.add_argument('--vocal_gate_frames', type=int, default=256) # frames per scored crop
+    p.add_argument('--attention_chunk_size', type=int, default=0) # 0 computes attention densely
+    p.add_argument('--attention_residual_dtype', type=str.lower, choices=['fp32', 'fp16', 'bf16'], default='fp32')
     p.add_argument('--output_image', '-I', action='store_true')
     p.add_argument('--copy_source_images', action='store_true') # copies images from input into output
     p.add_argument('--postprocess', '-p', action='store_true')
@@ -172,11 +808,67 @@ def main():
     p.add_argument('--rename_dir', action='store_true')
     p.add_argument('--seed', type=int, default=1)
     p.add_argument('--model_in_filename', action='store_true')
-    # p.add_argument('--tta', '-t', action='store_true') # will add back eventually, need to experiment more with some new TTA techniques
-
-    args = p.parse_args()
-    args.models = [model for model in args.models.split(',')]
-
+    p.add_argument('--stream', action='store_true') # decode, separate and write in chunks so memory doesn't grow with track length
+    p.add_argument('--stream_blocksize', type=int, default=262144)
+    p.add_argument('--pipeline', action='store_true') # overlap decoding and encoding of neighbouring files with separation
+    p.add_argument('--queue_size', type=int, default=2)
+    p.add_argument('--manifest', type=str, default='') # jsonl of finished files; reruns skip files already done with the same inputs, models and settings
+    p.add_argument('--workers', type=int, default=0) # cpu worker processes sharing one copy of the weights, 0 or 1 for a single process
+    p.add_argument('--threads', type=int, default=0) # torch threads split across workers, 0 for every core
+    p.add_argument('--mask_cache', type=str, default='') # directory for per-model masks; reruns with other --models combinations reuse them
+    p.add_argument('--mask_cache_size', type=float, default=10) # GB
+    p.add_argument('--mask_cache_dtype', type=str, choices=['float16', 'uint8'], default='float16')
+    p.add_argument('--precision', type=str.lower, choices=['auto', 'fp32', 'bf16', 'fp16'], default='auto') # autocast dtype, auto is fp16 on cuda and fp32 on cpu
+    p.add_argument('--autotune', type=str.lower, choices=['auto', 'off'], default='auto') # per-model cropsize/padding/batchsize from autotune.py, unless given on the command line
+    p.add_argument('--autotune_profile', type=str, default='') # defaults to ~/.cache/frame-transformer/autotune-<host>.json
+    p.add_argument('--profile_layers', type=str, default='') # write per-module forward time, flops and activation size as a chrome trace json
+    p.add_argument('--profile_depth', type=int, default=1) # levels below the model that are timed, besides attention/linear/embedding modules
+    p.add_argument('--quantize', type=str.lower, choices=['none', 'dynamic', 'static'], default='none') # int8 cpu inference
+    p.add_argument('--quantize_calibration', type=str, default='quantization.json') # written by quantize.py --calibrate, used by --quantize static
+    p.add_argument('--tta', '-t', action='store_true') # average masks over several crop/context splits, batched together
+    p.add_argument('--tta_scales', type=int, default=3) # scale k keeps the centre 1/2^k of each crop, so costs 2^k patches
+    p.add_argument('--tta_swap', action='store_true') # also run every scale with left and right swapped
+
+    return p
+
+def explicit_options(parser, argv=None):
+    # options actually given on the command line, which always win over a tuned profile; parsing again with every
+    # default suppressed leaves only those in the namespace, however argparse matched them (-c512, --crop 512, ...)
+    defaults = [(action, action.default) for action in parser._actions]
+    parser_defaults = parser._defaults
+
+    try:
+        for action in parser._actions:
+            action.default = argparse.SUPPRESS
+        parser._defaults = {}
+
+        given, _ = parser.parse_known_args(argv)
+    finally:
+        for action, default in defaults:
+            action.default = default
+        parser._defaults = parser_defaults
+
+    return set(vars(given))
+
+def apply_autotune(models, device, args):
+    if args.stream:
+        # streaming walks every model over the same crops, so per-model settings don't apply
+        return
+
+    profile = autotune.load_profile(args.autotune_profile if args.autotune_profile != '' else autotune.default_profile_path())
+    explicit = getattr(args, 'explicit', set())
+
+    for model, name in zip(models, registry.selected(args.models)):
+        entry = profile.get(autotune.profile_key(device, name, args.precision, args.quantize))
+
+        # fixed-frame artifacts can only run the crop they were exported for
+        if entry is None or getattr(model, 'frames', None) is not None:
+            continue
+
+        model.tuned = { k: entry[k] for k in ['cropsize', 'padding', 'batchsize'] if k not in explicit }
+        print(f'{name}: using tuned ' + ', '.join(f'{k} {v}' for k, v in model.tuned.items()))
+
+def load_models(args):
     print('loading model...')
     device = torch.device('cpu')
 
@@ -188,43 +880,139 @@ def main():
     if torch.cuda.is_available() and args.gpu >= 0:
         device = torch.device('cuda:{}'.format(args.gpu))
 
-    if 'v7' in args.models:
-        print('loading v7')
-        model_v7 = FrameTransformerV7(in_channels=2, out_channels=2, channels=8, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=2)
-        model_v7.load_state_dict(torch.load(args.model_v7, map_location=device))
-        model_v7.to(device)
-        models.append(model_v7)
-
-    if 'v8' in args.models:
-        print('loading v8')
-        model_v8 = FrameTransformerV8(in_channels=2, out_channels=2, channels=8, expansion=2.2, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1)
-        model_v8.load_state_dict(torch.load(args.model_v8, map_location=device))
-        model_v8.to(device)
-        models.append(model_v8)
-
-    if 'v9' in args.models:
-        print('loading v9')
-        model_v9 = FrameTransformerV9(in_channels=10, out_channels=2, channels=16, expansion=512, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1, num_layers=17)
-        model_v9.load_state_dict(torch.load(args.model_v9, map_location=device))
-        model_v9.to(device)
-        models.append(model_v9)
-
-    if 'v10' in args.models:
-        print('loading v10')
-        model_v10 = FrameTransformerV10(in_channels=2, out_channels=2, embedding=8, expansion=4, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1)
-        model_v10.load_state_dict(torch.load(args.model_v10, map_location=device))
-        model_v10.to(device)
-        models.append(model_v10)
+    for name in registry.selected(args.models):
+        if name == 'v10' and args.model_v10_artifact != '':
+            print(f'loading v10 artifact {args.model_v10_artifact}')
+            model = artifacts.load_artifact(args.model_v10_artifact, device)
+            # tta and overlap-add feed bare --cropsize crops, the padded tiling and streaming add --padding on both sides
+            model.check_frames(args.cropsize if (args.tta or args.overlap_hop > 0) and not args.stream else args.cropsize + args.padding * 2)
+        else:
+            print(f'loading {name}')
+            model = checkpoints.load_model(lambda: registry.build(name), getattr(args, f'model_{name}'), device)
+
+        model.model_name = name
+        models.append(model)
+
+    if args.attention_chunk_size > 0 or args.attention_residual_dtype != 'fp32':
+        residual_dtype = { 'fp32': None, 'fp16': torch.float16, 'bf16': torch.bfloat16 }[args.attention_residual_dtype]
+
+        for model in models:
+            set_attention_chunking(model, args.attention_chunk_size if args.attention_chunk_size > 0 else None, residual_dtype)
+
+    if args.precision == 'auto':
+        args.precision = default_precision(device)
+
+    check_precision(device, args.precision)
+
+    if args.quantize != 'none':
+        if device.type != 'cpu':
+            raise ValueError('quantized models only run on cpu, drop --gpu to use --quantize')
+
+        if args.precision != 'fp32':
+            raise ValueError('quantized models run in fp32, drop --precision to use --quantize')
+
+        if 'v10' in args.models and args.model_v10_artifact != '':
+            raise ValueError('exported artifacts can\'t be quantized, drop --model_v10_artifact to use --quantize')
+
+        calibration = quantization.load_calibration(args.quantize_calibration) if args.quantize == 'static' else {}
+
+        for model, name in zip(models, registry.selected(args.models)):
+            print(f'quantizing {name} ({args.quantize})')
+            quantization.quantize_model(model, args.quantize, calibration.get(name) if args.quantize == 'static' else None)
         
+    if args.autotune != 'off':
+        apply_autotune(models, device, args)
+
+    if isinstance(args.ensemble_weights, str):
+        weights = [float(w) for w in args.ensemble_weights.split(',')] if args.ensemble_weights != '' else []
+        if args.ensemble == 'weighted' and len(weights) != len(args.models):
+            raise ValueError('--ensemble weighted needs one --ensemble_weights entry per model in --models')
+
+        # weights follow the --models order, models are always loaded in registry order
+        weights = dict(zip(args.models, weights))
+        args.ensemble_weights = [weights[m] for m in registry.selected(args.models) if m in weights] or None
+
+    if args.vocal_gate != '':
+        if len(models) < 2:
+            raise ValueError('--vocal_gate needs two or more --models: it scores the first model\'s mask, which always runs in full, so with one model it only adds the detector\'s cost')
+
+        if args.vocal_gate_threshold <= 0:
+            args.vocal_gate_threshold = vocal_gate.load_calibration(args.vocal_gate_calibration)['threshold']
+
+        # gates on the mask of the first model loaded, which always runs in full
+        print(f'loading vocal gate, threshold {args.vocal_gate_threshold:.3f}')
+        models[0].vocal_gate = vocal_gate.VocalGate(args.vocal_gate, device, args.vocal_gate_threshold, args.vocal_gate_frames)
+
+        if args.stream:
+            print('vocal gate is not used when streaming')
+
+    if args.tta and args.stream:
+        print('tta is not used when streaming')
+
+    if args.tta and any(model.autoregressive for model in models):
+        print('tta is skipped for autoregressive models, each crop depends on the previous one')
+
+    cache = None
+    if args.mask_cache != '':
+        if args.stream:
+            print('mask cache is not used when streaming')
+        else:
+            cache = mask_cache.MaskCache(args.mask_cache, int(args.mask_cache_size * 1024 ** 3), args.mask_cache_dtype)
+
+            for model, name in zip(models, registry.selected(args.models)):
+                path = args.model_v10_artifact if name == 'v10' and args.model_v10_artifact != '' else getattr(args, f'model_{name}')
+                model.checkpoint_hash = cache.checkpoint_hash(path)
+
     print('done')
 
+    return device, models, cache
+
+def process_file(file, models, device, args, timer, cover='', cache=None, batchers=None):
+    inst_file, vocal_file = output_paths(file, args)
+
+    if args.stream:
+        with timer('separate'):
+            separators = [Separator(model, device, args.batchsize, args.cropsize, 2048, args.postprocess, model.autoregressive, batchers[i] if batchers is not None else None, args.precision) for i, model in enumerate(models)]
+            duration = separate_stream(separators, file, args.sr, args.hop_length, 2048, args.padding, args.stream_blocksize, temp_path(inst_file), temp_path(vocal_file) if args.create_vocals else None, args.ensemble, args.ensemble_weights)
+
+        with timer('write'):
+            finish_track(file, inst_file, vocal_file, duration, args, cover)
+    else:
+        with timer('load'):
+            X_spec, sr, audio_hash = load_track(file, args, cache)
+
+        with timer('separate'):
+            y_spec, v_spec = separate_track(X_spec, models, device, args, cache, audio_hash, batchers, timer)
+
+        with timer('write'):
+            write_track(file, y_spec, v_spec, sr, inst_file, vocal_file, args, cover)
+
+    return inst_file, vocal_file if args.create_vocals else None
+
+def main():
+    p = make_parser()
+    p.add_argument('--input', '-i', required=True)
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+    args.explicit = explicit_options(p)
+
+    device, models, cache = load_models(args)
+
+    profiler = None
+    if args.profile_layers != '' and args.workers > 1:
+        raise ValueError('--profile_layers only profiles a single process, drop --workers')
+    elif args.profile_layers != '':
+        profiler = layer_profiler.LayerProfiler(args.profile_layers)
+        for model, name in zip(models, registry.selected(args.models)):
+            profiler.attach(model, name, args.profile_depth)
+
     output_folder = args.output
     if output_folder != '' and not os.path.exists(output_folder):
         os.makedirs(output_folder)
         
-    output_format = args.output_format.lower()
-    if output_format not in ["flac", "wav", "mp3"]:
-        output_format = "flac"
+    args.output_format = args.output_format.lower()
+    if args.output_format not in ["flac", "wav", "mp3"]:
+        args.output_format = "flac"
 
     cover = ""
     files = []
@@ -253,82 +1041,50 @@ def main():
                 if args.copy_source_images:
                     shutil.copy(cover, output_folder)
 
-    for file in tqdm(files):
-        print('\nloading wave source...', end=' ')
-        X, sr = librosa.load(
-            file, args.sr, False, dtype=np.float32, res_type='kaiser_fast')
-        basename = os.path.splitext(os.path.basename(file))[0]
-        print('done')
-
-        if X.ndim == 1:
-            X = np.asarray([X, X])
-
-        print('stft of wave source...', end=' ')
-        X_spec = spec_utils.wave_to_spectrogram(X, args.hop_length, 2048)
-        print('done')
-
-        y_specs = []
-        v_specs = []
-
-        for model in models:
-            sp = Separator(model, device, args.batchsize, args.cropsize, 2048, args.postprocess, model.autoregressive)
-            y_spec, v_spec, _ = sp.separate(X_spec, padding=args.padding)
-            y_specs.append(y_spec)
-            v_specs.append(v_spec)
-    
-        y_mag = None
-        v_mag = None
-        y_phase = np.angle(y_specs[-1])
-        v_phase = np.angle(v_specs[-1])
-
-        for y_spec in y_specs:
-            y_mag = np.abs(y_spec) if y_mag is None else np.minimum(y_mag, np.abs(y_spec))
-            v_mag = np.abs(v_spec) if v_mag is None else np.maximum(v_mag, np.abs(v_spec))
-
-        y_spec = y_mag * np.exp(1.j * y_phase)
-        v_spec = v_mag * np.exp(1.j * v_phase)
-        
-        filename_suffix = ''
-        if args.model_in_filename:
-            filename_suffix = filename_suffix.join(args.models).upper()
-
-        print('\ninverse stft of instruments...', end=' ')
-        wave = spec_utils.spectrogram_to_wave(y_spec, hop_length=args.hop_length)
-        print('done')
-        inst_file = f'{output_folder}/{basename}_Instruments{filename_suffix}.{output_format}'
-        sf.write(inst_file, wave.T, sr)
-
-        filetags = music_tag.load_file(file)
-        inst_tags = music_tag.load_file(inst_file)
-        inst_tags['tracktitle'] = filetags['tracktitle']
-        inst_tags['album'] = filetags['album']
-        inst_tags['artist'] = filetags['artist']
-        inst_tags['tracknumber'] = filetags['tracknumber']
-        inst_tags['totaltracks'] = filetags['totaltracks']
-        inst_tags['year'] = filetags['year']
-        inst_tags.save()
-
-        if args.create_webm:
-            vid_file = f'{output_folder}/{basename}.mp4'
-            os.system(f'ffmpeg -y -framerate 1 -loop 1 -i "{cover}" -i "{inst_file}" -t {librosa.get_duration(wave, sr=args.sr)} "{vid_file}"')
-
-        if args.create_vocals:
-            print('\ninverse stft of vocals...', end=' ')
-            wave = spec_utils.spectrogram_to_wave(v_spec, hop_length=args.hop_length)
-            print('done')
-            sf.write(f'{output_folder}/{basename}_Vocals{filename_suffix}.{output_format}', wave.T, sr)
-
-            vocal_tags = music_tag.load_file(f'{output_folder}/{basename}_Vocals{filename_suffix}.{output_format}')
-            vocal_tags['tracktitle'] = f'{filetags["tracktitle"]} (Vocals)'
-            vocal_tags['album'] = f'{filetags["album"]} (Vocals)'
-            vocal_tags['artist'] = filetags['artist']
-            vocal_tags['tracknumber'] = filetags['tracknumber']
-            vocal_tags['totaltracks'] = filetags['totaltracks']
-            vocal_tags['year'] = filetags['year']
-            vocal_tags.save()
-
-        if args.rename_dir:
-            os.system(f'python song-renamer.py --dir "{output_folder}"')
+    done = None
+    if args.manifest != '':
+        book = manifest.Manifest(args.manifest)
+        signature = manifest.signature(args, { model.model_name: model_settings(model, args) for model in models })
+        manifest.remove_stale_temp_files(output_folder if output_folder != '' else '.')
+
+        files = book.pending(files, signature, lambda file: (output_paths(file, args)[0], output_paths(file, args)[1] if args.create_vocals else None))
+        done = lambda file, outputs, error=None: book.record(file, signature, 'failed' if error is not None else 'done', outputs, error)
+
+    timer = StageTimer()
+    start = time.perf_counter()
+
+    if args.workers > 1:
+        run_workers(files, models, device, args, cover, timer, cache, done)
+    elif args.pipeline and not args.stream:
+        run_pipeline(files, models, device, args, cover, timer, cache, done)
+    else:
+        failed = []
+        for file in tqdm(files):
+            if done is None:
+                process_file(file, models, device, args, timer, cover, cache)
+                continue
+
+            # with a manifest one bad file is recorded and skipped rather than ending a library-sized run
+            try:
+                outputs = process_file(file, models, device, args, timer, cover, cache)
+                done(file, outputs)
+            except Exception as e:
+                traceback.print_exc()
+                done(file, None, f'{type(e).__name__}: {e}')
+                failed.append(file)
+
+        if failed:
+            print(f'{len(failed)} files failed, see {args.manifest}')
+
+    timer.report(time.perf_counter() - start, len(files))
+
+    if profiler is not None:
+        profiler.detach()
+        profiler.report()
+        profiler.save()
+
+    if cache is not None:
+        print(f'mask cache: {cache.hits} hits, {cache.misses} misses')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,94 @@
+import json
+import os
+
+import torch
+import torch.nn as nn
+
+# the temporal u-net halves the frame axis five times
+FRAME_MULTIPLE = 32
+
+def _metadata_path(path):
+    return path + '.json'
+
+def load_metadata(path):
+    with open(_metadata_path(path), 'r') as f:
+        return json.load(f)
+
+def _save_metadata(path, **fields):
+    with open(_metadata_path(path), 'w') as f:
+        json.dump(fields, f, indent=2)
+
+def example_input(model, frames, device, batchsize=1):
+    in_channels = model.enc1.conv1.in_channels
+    return torch.rand(batchsize, in_channels, model.max_bin, frames, device=device)
+
+def export_torchscript(model, path, frames, device, dynamic=True):
+    if frames % FRAME_MULTIPLE != 0:
+        raise ValueError(f'frames must be a multiple of {FRAME_MULTIPLE}')
+
+    model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input(model, frames, device), check_trace=False)
+        traced = torch.jit.freeze(traced)
+
+    traced.save(path)
+    _save_metadata(path, format='torchscript', frames=None if dynamic else frames, in_channels=model.enc1.conv1.in_channels, max_bin=model.max_bin)
+
+    return path
+
+def export_onnx(model, path, frames, device, dynamic=True, opset=17):
+    if frames % FRAME_MULTIPLE != 0:
+        raise ValueError(f'frames must be a multiple of {FRAME_MULTIPLE}')
+
+    dynamic_axes = { 'x': { 0: 'batch', 3: 'frames' }, 'mask': { 0: 'batch', 3: 'frames' } } if dynamic else { 'x': { 0: 'batch' }, 'mask': { 0: 'batch' } }
+
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(model, example_input(model, frames, device), path, input_names=['x'], output_names=['mask'], dynamic_axes=dynamic_axes, opset_version=opset)
+
+    _save_metadata(path, format='onnx', frames=None if dynamic else frames, in_channels=model.enc1.conv1.in_channels, max_bin=model.max_bin)
+
+    return path
+
+class ArtifactModel(nn.Module):
+    # stands in for the python model in Separator; artifacts are always exported from non-autoregressive models
+    def __init__(self, path, device):
+        super(ArtifactModel, self).__init__()
+
+        self.path = path
+        self.device = device
+        self.metadata = load_metadata(path)
+        self.frames = self.metadata['frames']
+        self.autoregressive = False
+        self.session = None
+        self.module = None
+
+        if self.metadata['format'] == 'torchscript':
+            self.module = torch.jit.load(path, map_location=device)
+        elif self.metadata['format'] == 'onnx':
+            import onnxruntime
+
+            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider'] if torch.device(device).type == 'cuda' else ['CPUExecutionProvider']
+            self.session = onnxruntime.InferenceSession(path, providers=providers)
+        else:
+            raise ValueError(f'unknown artifact format: {self.metadata["format"]}')
+
+    def check_frames(self, frames):
+        if self.frames is not None and self.frames != frames:
+            raise ValueError(f'{self.path} was exported for {self.frames} frames but crops are {frames} frames; use --cropsize/--padding to match or export with --dynamic')
+
+    def forward(self, x):
+        self.check_frames(x.shape[3])
+
+        if self.module is not None:
+            return self.module(x)
+
+        # onnxruntime runs in fp32 regardless of autocast
+        mask = self.session.run(['mask'], { 'x': x.detach().float().cpu().numpy() })[0]
+        return torch.from_numpy(mask).to(x.device)
+
+def load_artifact(path, device):
+    if not os.path.isfile(_metadata_path(path)):
+        raise ValueError(f'{path} has no {os.path.basename(_metadata_path(path))} next to it, re-export it with export.py')
+
+    return ArtifactModel(path, device)
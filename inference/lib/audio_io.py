@@ -0,0 +1,58 @@
+import numpy as np
+import soundfile as sf
+
+def info(path):
+    # None when libsndfile can't decode the container (m4a, mp4, ...), which then goes through librosa
+    try:
+        return sf.info(path)
+    except RuntimeError:
+        return None
+
+def load(path, sr=44100, res_type='kaiser_fast'):
+    # same result as librosa.load(path, sr, mono=False, dtype=float32): (channels, samples), or (samples,) for mono
+    file_info = info(path)
+
+    if file_info is None:
+        import librosa
+
+        X, _ = librosa.load(path, sr=sr, mono=False, dtype=np.float32, res_type=res_type)
+        return X, sr
+
+    X, native_sr = sf.read(path, dtype='float32', always_2d=True)
+    X = X.T[0] if X.shape[1] == 1 else np.ascontiguousarray(X.T)
+
+    # only files at another rate pay for resampling
+    if native_sr != sr:
+        import librosa
+
+        X = librosa.resample(X, orig_sr=native_sr, target_sr=sr, res_type=res_type).astype(np.float32)
+
+    return X, sr
+
+def load_stereo(path, sr=44100, res_type='kaiser_fast'):
+    X, sr = load(path, sr, res_type)
+
+    if X.ndim == 1:
+        X = np.asarray([X, X])
+
+    return X, sr
+
+def stream(path, sr=44100, block_size=262144):
+    # stereo float32 blocks; libsndfile can only stream when no resampling is needed, anything else is decoded up front
+    file_info = info(path)
+
+    if file_info is None or file_info.samplerate != sr:
+        X, _ = load_stereo(path, sr)
+
+        for start in range(0, X.shape[1], block_size):
+            yield X[:2, start:start + block_size]
+
+        return
+
+    for block in sf.blocks(path, blocksize=block_size, dtype='float32', always_2d=True):
+        block = block.T
+
+        if block.shape[0] == 1:
+            block = np.concatenate((block, block), axis=0)
+
+        yield block[:2]
@@ -0,0 +1,54 @@
+import json
+import os
+import socket
+
+import torch
+
+def default_profile_path():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'frame-transformer', f'autotune-{socket.gethostname()}.json')
+
+def device_name(device):
+    device = torch.device(device)
+    return torch.cuda.get_device_name(device) if device.type == 'cuda' else 'cpu'
+
+def profile_key(device, name, precision, quantize='none'):
+    # the same model tunes differently per device and per numeric mode
+    return f'{device_name(device)}|{name}|{precision}|{quantize}'
+
+def load_profile(path):
+    if not os.path.isfile(path):
+        return {}
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_profile(path, entries):
+    profile = load_profile(path)
+    profile.update(entries)
+
+    if os.path.dirname(path) != '':
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2, sort_keys=True)
+
+def memory_budget(device):
+    device = torch.device(device)
+
+    if device.type == 'cuda':
+        return torch.cuda.get_device_properties(device).total_memory
+
+    try:
+        import psutil
+        return psutil.virtual_memory().total
+    except ImportError:
+        pass
+
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        # windows has no sysconf
+        raise ValueError('could not read the amount of system memory, install psutil or pass --memory_budget')
+
+def is_out_of_memory(e):
+    return isinstance(e, (RuntimeError, MemoryError)) and ('out of memory' in str(e).lower() or isinstance(e, MemoryError))
@@ -0,0 +1,107 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class _Patch(object):
+    def __init__(self, X):
+        self.X = X
+        self.mask = None
+        self.error = None
+        self.submitted = time.perf_counter()
+        self.done = threading.Event()
+
+
+class PatchBatcher(object):
+    # runs forward passes for one model on a single thread, packing crop patches from every caller into
+    # batches of up to max_batch, or whatever has arrived once the oldest patch has waited max_wait seconds.
+    def __init__(self, forward, max_batch=8, max_wait=0.01):
+        self.forward = forward
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+
+        self.batches = 0
+        self.patches = 0
+        self.wait_time = 0
+        self.forward_time = 0
+        self.started = time.perf_counter()
+
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def __call__(self, X_batch):
+        patches = [_Patch(X) for X in X_batch]
+
+        for patch in patches:
+            self.pending.put(patch)
+
+        for patch in patches:
+            patch.done.wait()
+
+            if patch.error is not None:
+                raise patch.error
+
+        return np.asarray([patch.mask for patch in patches])
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.perf_counter() - self.started
+
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'batches': self.batches,
+                'patches': self.patches,
+                'mean_batch_size': self.patches / self.batches if self.batches > 0 else 0,
+                'mean_wait_ms': self.wait_time / self.patches * 1000 if self.patches > 0 else 0,
+                'forward_seconds': self.forward_time,
+                'utilization': self.forward_time / elapsed if elapsed > 0 else 0,
+                'patches_per_second': self.patches / elapsed if elapsed > 0 else 0
+            }
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        deadline = batch[0].submitted + self.max_wait
+
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.pending.get(timeout=max(deadline - time.perf_counter(), 0)))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+
+            # crops with different padding/cropsize can't share a tensor
+            groups = {}
+            for patch in batch:
+                groups.setdefault(patch.X.shape, []).append(patch)
+
+            for group in groups.values():
+                start = time.perf_counter()
+
+                try:
+                    masks = self.forward([patch.X for patch in group])
+                except Exception as e:
+                    masks = [None] * len(group)
+                    for patch in group:
+                        patch.error = e
+
+                elapsed = time.perf_counter() - start
+
+                with self.lock:
+                    self.batches += 1
+                    self.patches += len(group)
+                    self.forward_time += elapsed
+                    self.wait_time += sum(start - patch.submitted for patch in group)
+
+                for patch, mask in zip(group, masks):
+                    patch.mask = mask
+                    patch.done.set()
@@ -0,0 +1,57 @@
+import itertools
+
+import torch
+
+def load_state_dict(path, device):
+    # safetensors files are mapped straight onto the device without unpickling; .pth files are still read for
+    # compatibility, memory-mapped and restricted to tensors where this torch supports it
+    if path.endswith('.safetensors'):
+        try:
+            from safetensors.torch import load_file
+        except ImportError:
+            raise ImportError(f'{path} needs the safetensors package, pip install safetensors or pass the .pth checkpoint')
+
+        return load_file(path, device=str(torch.device(device)))
+
+    try:
+        return torch.load(path, map_location=device, mmap=True, weights_only=True)
+    except TypeError:
+        return torch.load(path, map_location=device)
+    except RuntimeError:
+        # legacy non-zipfile checkpoints can't be memory mapped
+        return torch.load(path, map_location=device, weights_only=True)
+
+def save_state_dict(path, state_dict, metadata=None):
+    from safetensors.torch import save_file
+
+    # safetensors refuses tensors that share storage or aren't contiguous
+    save_file({ k: v.detach().contiguous().clone() for k, v in state_dict.items() }, path, metadata=metadata)
+
+def _on_meta(module):
+    tensors = itertools.chain(
+        module.parameters(recurse=False),
+        module.buffers(recurse=False),
+        (v for v in vars(module).values() if isinstance(v, torch.Tensor)))
+
+    return any(t.is_meta for t in tensors)
+
+def load_model(build, path, device):
+    # the model is built on the meta device and the loaded tensors become its parameters, so the weights exist
+    # exactly once, already on the device, instead of random init + loaded copy + load_state_dict copy
+    state_dict = load_state_dict(path, device)
+
+    try:
+        with torch.device('meta'):
+            model = build()
+
+        model.load_state_dict(state_dict, assign=True)
+    except (AttributeError, TypeError):
+        # torch < 2.1 has no default device context or assign
+        model = None
+
+    # anything __init__ kept outside the state dict (plain tensor attributes) would still be on meta
+    if model is None or any(_on_meta(m) for m in model.modules()):
+        model = build()
+        model.load_state_dict(state_dict)
+
+    return model.to(device)
@@ -8,7 +8,6 @@ import numpy as np
 import torch
 import torch.utils.data
 from tqdm import tqdm
-import librosa
 
 import hashlib
 
@@ -0,0 +1,61 @@
+import numpy as np
+
+REDUCERS = ['min', 'max', 'mean', 'median', 'weighted']
+
+class MaskReducer(object):
+    # folds each model's instrument mask in as soon as it's ready, so only one running mask is resident
+    # whatever the ensemble size. median is the exception: it needs every mask, kept at float16.
+    def __init__(self, method='min', weights=None):
+        if method not in REDUCERS:
+            raise ValueError(f'ensemble must be one of {", ".join(REDUCERS)}')
+
+        self.method = method
+        self.weights = weights
+        self.mask = None
+        self.masks = []
+        self.total_weight = 0
+        self.count = 0
+
+    def add(self, mask):
+        weight = 1.0
+        if self.method == 'weighted':
+            if self.weights is None or self.count >= len(self.weights):
+                raise ValueError('weighted ensemble needs one weight per model')
+
+            weight = self.weights[self.count]
+
+        self.count += 1
+
+        if self.method == 'median':
+            self.masks.append(mask.astype(np.float16))
+            return
+
+        if self.mask is None:
+            self.mask = mask.astype(np.float32) * weight if self.method in ['mean', 'weighted'] else mask.astype(np.float32)
+        elif self.method == 'min':
+            np.minimum(self.mask, mask, out=self.mask)
+        elif self.method == 'max':
+            np.maximum(self.mask, mask, out=self.mask)
+        else:
+            self.mask += np.multiply(mask, weight, dtype=np.float32)
+
+        self.total_weight += weight
+
+    def result(self):
+        if self.count == 0:
+            raise ValueError('no masks to reduce')
+
+        if self.method == 'median':
+            return np.median(np.stack(self.masks), axis=0).astype(np.float32)
+
+        if self.method in ['mean', 'weighted']:
+            return self.mask / self.total_weight
+
+        return self.mask
+
+def reduce_masks(masks, method='min', weights=None):
+    reducer = MaskReducer(method, weights)
+    for mask in masks:
+        reducer.add(mask)
+
+    return reducer.result()
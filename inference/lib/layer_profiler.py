@@ -0,0 +1,222 @@
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+
+# recorded at any depth on top of the model's direct children (the encoder/decoder levels)
+PROFILED_TYPES = [
+    'FrameEncoder', 'FrameDecoder', 'FrameTransformerEncoder', 'FrameTransformerDecoder',
+    'ConvolutionalEmbedding', 'MultichannelMultiheadAttention', 'MultichannelLinear'
+]
+
+def _tensors(value):
+    if isinstance(value, torch.Tensor):
+        return [value]
+
+    if isinstance(value, (list, tuple)):
+        return [t for v in value for t in _tensors(v)]
+
+    return []
+
+def estimate_flops(module, inputs, outputs):
+    # multiply-adds counted as two flops; only the module's own matmuls/convs, children count theirs
+    x = _tensors(inputs)
+    y = _tensors(outputs)
+    if not x or not y:
+        return None
+
+    x, y = x[0], y[0]
+
+    if isinstance(module, nn.Conv2d):
+        return 2 * y.numel() * (module.in_channels // module.groups) * module.kernel_size[0] * module.kernel_size[1]
+
+    if isinstance(module, nn.Linear):
+        return 2 * y.numel() * module.in_features
+
+    if type(module).__name__ == 'MultichannelLinear':
+        b, h, w = x.shape[0], x.shape[2], x.shape[3]
+        flops = 0
+
+        if getattr(module, 'weight_pw', None) is not None:
+            channels, out_features, in_features = module.weight_pw.shape
+            flops += 2 * b * channels * out_features * in_features * w
+            h = out_features
+
+        if getattr(module, 'weight_dw', None) is not None:
+            out_channels, in_channels = module.weight_dw.shape
+            flops += 2 * b * out_channels * in_channels * h * w
+
+        return flops
+
+    if type(module).__name__ == 'MultichannelMultiheadAttention' and hasattr(module, 'o_proj') and getattr(module.o_proj, 'weight_pw', None) is not None:
+        # q @ k^T and softmax(qk) @ v summed over heads; projections are counted by their own modules
+        b, w = x.shape[0], x.shape[3]
+        maps, _, inner = module.o_proj.weight_pw.shape
+        return 4 * b * maps * w * w * inner
+
+    return None
+
+class LayerProfiler(object):
+    # opt-in forward hooks that time modules of a FrameTransformer, estimate their flops and measure their activations.
+    # modules that override __call__ (MultichannelLinear, MultichannelLayerNorm, ConvolutionalEmbedding) never run
+    # nn.Module hooks, so they're profiled by temporarily swapping in a timed subclass instead.
+    def __init__(self, path='', max_steps=0, synchronize=True):
+        self.path = path
+        self.max_steps = max_steps
+        self.synchronize = synchronize
+        self.events = []
+        self.stats = {}
+        self.steps = {}
+        self.handles = []
+        self.swapped = []
+        self.stack = []
+        self.flops = 0
+        self.origin = time.perf_counter()
+        self.enabled = True
+        self.saved = False
+
+    def attach(self, model, prefix='', depth=1):
+        for name, module in model.named_modules():
+            level = 0 if name == '' else name.count('.') + 1
+            if name != '' and level > depth and type(module).__name__ not in PROFILED_TYPES:
+                # untimed convs and linears still count towards the flops of whichever timed module encloses them
+                if isinstance(module, (nn.Conv2d, nn.Linear)):
+                    self.handles.append(module.register_forward_hook(self._count_hook))
+
+                continue
+
+            label = '.'.join(p for p in [prefix, name] if p != '') or type(model).__name__
+
+            if type(module).__call__ is not nn.Module.__call__:
+                self._swap_call(module, label)
+            else:
+                self.handles.append(module.register_forward_pre_hook(self._pre_hook(label)))
+                self.handles.append(module.register_forward_hook(self._post_hook(label, module, root=name == '')))
+
+        return self
+
+    def detach(self):
+        for handle in self.handles:
+            handle.remove()
+
+        for module, cls in self.swapped:
+            module.__class__ = cls
+            del module._profile_label
+
+        self.handles = []
+        self.swapped = []
+
+    def _swap_call(self, module, label):
+        profiler = self
+        cls = type(module)
+
+        def __call__(self, *args, **kwargs):
+            profiler._start(self._profile_label, args)
+            out = cls.__call__(self, *args, **kwargs)
+            profiler._stop(self._profile_label, self, args, out)
+            return out
+
+        module._profile_label = label
+        module.__class__ = type(cls.__name__, (cls,), { '__call__': __call__ })
+        self.swapped.append((module, cls))
+
+    def _pre_hook(self, label):
+        def hook(module, inputs):
+            self._start(label, inputs)
+
+        return hook
+
+    def _post_hook(self, label, module, root=False):
+        def hook(module, inputs, outputs):
+            self._stop(label, module, inputs, outputs)
+
+            if root:
+                self._step(label)
+
+        return hook
+
+    def _count_hook(self, module, inputs, outputs):
+        if self.enabled:
+            self.flops += estimate_flops(module, inputs, outputs) or 0
+
+    def _sync(self, device):
+        if self.synchronize and device is not None and device.type == 'cuda':
+            torch.cuda.synchronize(device)
+
+    def _device(self, value):
+        tensors = _tensors(value)
+        return tensors[0].device if tensors else None
+
+    def _start(self, label, inputs):
+        if not self.enabled:
+            return
+
+        # work queued before this module shouldn't be charged to it
+        self._sync(self._device(inputs))
+        self.stack.append((time.perf_counter(), self.flops))
+
+    def _stop(self, label, module, inputs, outputs):
+        if not self.enabled or not self.stack:
+            return
+
+        tensors = _tensors(outputs)
+        self._sync(self._device(outputs))
+        end = time.perf_counter()
+
+        start, start_flops = self.stack.pop()
+        elapsed = end - start
+        activation_bytes = sum(t.numel() * t.element_size() for t in tensors)
+        self.flops += estimate_flops(module, inputs, outputs) or 0
+        flops = self.flops - start_flops
+
+        stat = self.stats.setdefault(label, { 'calls': 0, 'seconds': 0, 'flops': 0, 'activation_bytes': 0, 'type': type(module).__name__ })
+        stat['calls'] += 1
+        stat['seconds'] += elapsed
+        stat['flops'] += flops
+        stat['activation_bytes'] = max(stat['activation_bytes'], activation_bytes)
+
+        self.events.append({
+            'name': label,
+            'cat': stat['type'],
+            'ph': 'X',
+            'ts': (start - self.origin) * 1e6,
+            'dur': elapsed * 1e6,
+            'pid': os.getpid(),
+            'tid': 0,
+            'args': { 'flops': flops, 'activation_bytes': activation_bytes, 'shape': list(tensors[0].shape) if tensors else None }
+        })
+
+    def _step(self, label):
+        self.steps[label] = self.steps.get(label, 0) + 1
+
+        if self.max_steps > 0 and self.steps[label] >= self.max_steps:
+            # profiling every step of a long training run would only add sync overhead, so stop once enough are in
+            self.close()
+
+    def close(self):
+        # stops profiling and writes whatever was recorded, so runs shorter than max_steps still leave a profile behind
+        self.enabled = False
+        self.detach()
+
+        if self.path != '' and not self.saved:
+            self.save()
+            self.report()
+
+    def report(self):
+        print('\nlayer profile:')
+        print(f'  {"module":<40} {"calls":>6} {"total ms":>10} {"mean ms":>9} {"gflop":>9} {"gflop/s":>9} {"act mb":>8}')
+        for label, stat in sorted(self.stats.items(), key=lambda kv: -kv[1]['seconds']):
+            gflop = stat['flops'] / 1e9
+            print(f'  {label:<40} {stat["calls"]:>6} {stat["seconds"] * 1000:10.1f} {stat["seconds"] * 1000 / stat["calls"]:9.2f} {gflop:9.2f} {gflop / max(stat["seconds"], 1e-9):9.1f} {stat["activation_bytes"] / 1024 ** 2:8.1f}')
+
+    def save(self, path=None):
+        path = self.path if path is None else path
+
+        # chrome://tracing and perfetto read the traceEvents list; the summary rides along under its own key
+        with open(path, 'w') as f:
+            json.dump({ 'traceEvents': self.events, 'displayTimeUnit': 'ms', 'summary': self.stats }, f)
+
+        self.saved = True
+        print(f'wrote layer profile to {path}')
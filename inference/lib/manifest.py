@@ -0,0 +1,138 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+
+import soundfile as sf
+
+from lib import mask_cache
+
+class Manifest(object):
+    # append-only json lines, one record per finished or failed file; the last record for an input wins and a
+    # line torn by a crash is ignored, so the file is always safe to resume from
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self.lock = threading.Lock()
+
+        if os.path.isfile(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+
+                    self.records[record['input']] = record
+
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.audio_seconds = 0
+        self.started = None
+
+    def input_hash(self, file):
+        # rehashing a whole library on every restart would cost as much as a pass over it, so trust size and mtime
+        stat = os.stat(file)
+        record = self.records.get(os.path.abspath(file))
+
+        if record is not None and record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns:
+            return record['input_hash'], stat
+
+        return mask_cache.file_hash(file), stat
+
+    def is_done(self, file, signature, outputs):
+        record = self.records.get(os.path.abspath(file))
+        if record is None or record['status'] != 'done' or record['signature'] != signature:
+            return False
+
+        if record['input_hash'] != self.input_hash(file)[0]:
+            return False
+
+        return all(os.path.isfile(o) for o in outputs if o is not None)
+
+    def pending(self, files, signature, outputs):
+        todo = [file for file in files if not self.is_done(file, signature, outputs(file))]
+        print(f'manifest: {len(files) - len(todo)} of {len(files)} files already done, {len(todo)} to go')
+
+        self.total = len(todo)
+        self.started = time.perf_counter()
+
+        return todo
+
+    def record(self, file, signature, status, outputs=None, error=None):
+        input_hash, stat = self.input_hash(file)
+        record = {
+            'input': os.path.abspath(file),
+            'input_hash': input_hash,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'signature': signature,
+            'status': status,
+            'outputs': [o for o in outputs if o is not None] if outputs is not None else [],
+            'error': error,
+            'finished': time.strftime('%Y-%m-%dT%H:%M:%S')
+        }
+
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            self.records[record['input']] = record
+
+            if status == 'done':
+                self.done += 1
+                self.audio_seconds += self._duration(record['outputs'])
+            else:
+                self.failed += 1
+
+            self._report()
+
+    def _duration(self, outputs):
+        try:
+            return sf.info(outputs[0]).duration if outputs else 0
+        except (RuntimeError, OSError):
+            return 0
+
+    def _report(self):
+        elapsed = time.perf_counter() - self.started
+        finished = self.done + self.failed
+        rate = finished / elapsed if elapsed > 0 else 0
+        eta = (self.total - finished) / rate if rate > 0 else 0
+
+        print(f'manifest: {finished}/{self.total} ({self.failed} failed), {rate * 3600:.0f} files/h, {self.audio_seconds / elapsed if elapsed > 0 else 0:.1f}x realtime, eta {int(eta // 3600)}:{int(eta % 3600 // 60):02d}:{int(eta % 60):02d}')
+
+def signature(args, settings=None):
+    # everything that changes the bytes written; a rerun with any of these changed redoes the file. settings is the
+    # (cropsize, padding, batchsize) each model actually runs with once autotune has been applied
+    fields = { k: getattr(args, k, None) for k in [
+        'models', 'sr', 'hop_length', 'cropsize', 'padding', 'overlap_hop', 'batchsize', 'precision', 'quantize',
+        'attention_residual_dtype', 'tta', 'tta_scales', 'tta_swap', 'ensemble', 'ensemble_weights', 'postprocess',
+        'silence_threshold', 'silence_mask', 'vocal_gate', 'vocal_gate_threshold', 'vocal_gate_frames', 'stream',
+        'output_format', 'create_vocals', 'model_in_filename'
+    ] }
+
+    # cached masks are stored quantized, so whether and how they were cached shows in the output
+    fields['mask_cache_dtype'] = getattr(args, 'mask_cache_dtype', None) if getattr(args, 'mask_cache', '') != '' else None
+    fields['settings'] = { name: list(s) for name, s in (settings or {}).items() }
+
+    for name in args.models:
+        path = args.model_v10_artifact if name == 'v10' and getattr(args, 'model_v10_artifact', '') != '' else getattr(args, f'model_{name}')
+        stat = os.stat(path)
+        fields[f'checkpoint_{name}'] = [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+    return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+def remove_stale_temp_files(directory, max_age=3600):
+    # temp outputs left behind by a crashed run; finished outputs are always renamed into place. another run may be
+    # writing into the same folder, so only files nothing has touched for max_age seconds are taken as abandoned
+    for path in glob.glob(os.path.join(directory, '.*.tmp.*')):
+        try:
+            if time.time() - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
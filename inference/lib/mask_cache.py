@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+
+def file_hash(path, block_size=1 << 24):
+    h = hashlib.sha1()
+
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+
+    return h.hexdigest()
+
+
+def array_hash(arr):
+    return hashlib.sha1(np.ascontiguousarray(arr).tobytes()).hexdigest()
+
+
+class MaskCache(object):
+    def __init__(self, root, max_bytes=10 * 1024 ** 3, dtype='float16'):
+        if dtype not in ['float16', 'uint8']:
+            raise ValueError('dtype must be float16 or uint8')
+
+        self.root = root
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, **fields):
+        return hashlib.sha1(json.dumps(fields, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def checkpoint_hash(self, path):
+        # hashing multi-GB checkpoints every run would eat into the savings, so remember them by size and mtime
+        index_path = os.path.join(self.root, 'checkpoints.json')
+        stat = os.stat(path)
+        entry = f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+        try:
+            with open(index_path, 'r') as f:
+                index = json.load(f)
+        except (FileNotFoundError, ValueError):
+            index = {}
+
+        if entry not in index:
+            index[entry] = file_hash(path)
+
+            tmp_path = f'{index_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, index_path)
+
+        return index[entry]
+
+    def _path(self, key):
+        return os.path.join(self.root, f'{key}.{self.dtype}.npy')
+
+    def get(self, key):
+        path = self._path(key)
+
+        try:
+            mask = np.load(path, mmap_mode='r')
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+
+        # mtime doubles as the last-used time for eviction; another process may have just evicted the entry, in
+        # which case the map can't be trusted to be the whole file and it counts as a miss
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+
+        return self._decode(mask)
+
+    def put(self, key, mask):
+        if self.dtype == 'uint8':
+            data = np.round(np.clip(mask, 0, 1) * 255).astype(np.uint8)
+        else:
+            data = mask.astype(np.float16)
+
+        # write then rename so a crash never leaves a truncated entry behind
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, data)
+
+        # on windows an entry that this or another run still has mapped can't be replaced; the one already there holds
+        # the same mask, so keep it
+        try:
+            os.replace(tmp_path, path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+        self.evict()
+
+        # hand back what later runs will read so cached and uncached runs produce the same output
+        return self._decode(data)
+
+    def _decode(self, data):
+        # float16 entries are handed back as stored, a hit stays a read-only map that's paged in as the ensemble
+        # reads it; uint8 has to be rescaled, which takes one float16 copy
+        if self.dtype == 'uint8':
+            return np.multiply(data, np.float16(1 / 255), dtype=np.float16)
+
+        return data
+
+    def evict(self):
+        # other processes may evict the same entries concurrently, so a vanished file is not an error, and a mapped
+        # one (which windows won't delete) is left for a later eviction
+        entries = []
+        for f in os.listdir(self.root):
+            if f.endswith('.npy'):
+                path = os.path.join(self.root, f)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                continue
+
+            total -= size
@@ -0,0 +1,151 @@
+import json
+
+import torch
+import torch.nn as nn
+
+# torch.ao is only imported once something is quantized or calibrated, it isn't free and most runs never touch it
+
+# fbgemm/x86 kernels can overflow 16 bit accumulators with full range activations, qnnpack can't
+def _reduce_range():
+    return torch.backends.quantized.engine in ['fbgemm', 'x86']
+
+def _quantize_weight(weight):
+    # symmetric int8 with one scale per output row/filter
+    from torch.ao.quantization.observer import PerChannelMinMaxObserver
+
+    observer = PerChannelMinMaxObserver(ch_axis=0, dtype=torch.qint8, qscheme=torch.per_channel_symmetric)
+    observer(weight)
+    scale, zero_point = observer.calculate_qparams()
+
+    return torch.quantize_per_channel(weight, scale.float(), zero_point.long(), 0, torch.qint8)
+
+def _swap(model, match, build):
+    for name, module in list(model.named_modules()):
+        if name != '' and match(module):
+            parent_name, _, child_name = name.rpartition('.')
+            parent = model.get_submodule(parent_name) if parent_name != '' else model
+            setattr(parent, child_name, build(name, module))
+
+def _is_multichannel_linear(module):
+    # each model version has its own copy of the class, so match by name
+    return type(module).__name__ == 'MultichannelLinear'
+
+def _is_real_conv(module):
+    # quantized kernels are real-valued only, so convs built with a complex dtype are left alone
+    return type(module) == nn.Conv2d and not module.weight.is_complex()
+
+class DynamicMultichannelLinear(nn.Module):
+    def __init__(self, linear):
+        super(DynamicMultichannelLinear, self).__init__()
+
+        self.bias_pw = linear.bias_pw
+        self.bias_dw = linear.bias_dw
+        self.reduce_range = _reduce_range()
+
+        self.packed_pw = None
+        if linear.weight_pw is not None:
+            self.packed_pw = [torch.ops.quantized.linear_prepack(_quantize_weight(w), None) for w in linear.weight_pw.detach().float()]
+
+        self.packed_dw = None
+        if linear.weight_dw is not None:
+            self.packed_dw = torch.ops.quantized.linear_prepack(_quantize_weight(linear.weight_dw.detach().float()), None)
+
+    def forward(self, x):
+        if self.packed_pw is not None:
+            x = x.transpose(2,3)
+            x = torch.stack([torch.ops.quantized.linear_dynamic(x[:, c].contiguous(), packed, self.reduce_range) for c, packed in enumerate(self.packed_pw)], dim=1).transpose(2,3)
+
+            if self.bias_pw is not None:
+                x = x + self.bias_pw
+
+        if self.packed_dw is not None:
+            x = torch.ops.quantized.linear_dynamic(x.transpose(1,3).contiguous(), self.packed_dw, self.reduce_range).transpose(1,3)
+
+            if self.bias_dw is not None:
+                x = x + self.bias_dw
+
+        return x
+
+class ObservedConv2d(nn.Module):
+    # records activation ranges during calibration, otherwise behaves like the wrapped conv
+    def __init__(self, conv):
+        super(ObservedConv2d, self).__init__()
+        from torch.ao.quantization.observer import MinMaxObserver
+
+        self.conv = conv
+        self.input_observer = MinMaxObserver(dtype=torch.quint8, reduce_range=_reduce_range())
+        self.output_observer = MinMaxObserver(dtype=torch.quint8, reduce_range=_reduce_range())
+
+    def forward(self, x):
+        self.input_observer(x.detach().float())
+        x = self.conv(x)
+        self.output_observer(x.detach().float())
+
+        return x
+
+    def qparams(self):
+        in_scale, in_zero_point = self.input_observer.calculate_qparams()
+        out_scale, out_zero_point = self.output_observer.calculate_qparams()
+
+        return [in_scale.item(), in_zero_point.item(), out_scale.item(), out_zero_point.item()]
+
+class StaticConv2d(nn.Module):
+    def __init__(self, conv, qparams):
+        super(StaticConv2d, self).__init__()
+        from torch.ao.nn.quantized import Conv2d as QuantizedConv2d
+
+        self.scale, self.zero_point, out_scale, out_zero_point = qparams
+        self.conv = QuantizedConv2d(conv.in_channels, conv.out_channels, conv.kernel_size, stride=conv.stride, padding=conv.padding, dilation=conv.dilation, groups=conv.groups, bias=conv.bias is not None)
+        self.conv.set_weight_bias(_quantize_weight(conv.weight.detach().float()), conv.bias.detach().float() if conv.bias is not None else None)
+        self.conv.scale = out_scale
+        self.conv.zero_point = int(out_zero_point)
+
+    def forward(self, x):
+        x = torch.quantize_per_tensor(x.float(), self.scale, int(self.zero_point), torch.quint8)
+        return self.conv(x).dequantize()
+
+def quantize_dynamic(model):
+    # int8 weights, activations quantized on the fly; convs are left in fp32
+    import torch.ao.quantization
+
+    model.eval()
+    _swap(model, _is_multichannel_linear, lambda name, module: DynamicMultichannelLinear(module))
+    torch.ao.quantization.quantize_dynamic(model, { nn.Linear }, dtype=torch.qint8, inplace=True)
+
+    return model
+
+def prepare_calibration(model):
+    model.eval()
+    _swap(model, _is_real_conv, lambda name, module: ObservedConv2d(module))
+
+    return model
+
+def calibration_qparams(model):
+    return { name: module.qparams() for name, module in model.named_modules() if isinstance(module, ObservedConv2d) }
+
+def quantize_static(model, qparams):
+    # convs get int8 activations from calibrated ranges; anything missing from the calibration stays fp32
+    quantize_dynamic(model)
+    _swap(model, _is_real_conv, lambda name, module: StaticConv2d(module, qparams[name]) if name in qparams else module)
+
+    return model
+
+def load_calibration(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_calibration(path, calibration):
+    with open(path, 'w') as f:
+        json.dump(calibration, f, indent=2)
+
+def quantize_model(model, mode, qparams=None):
+    if mode == 'dynamic':
+        return quantize_dynamic(model)
+
+    if mode == 'static':
+        if qparams is None:
+            raise ValueError('static quantization needs calibration, run quantize.py --calibrate first')
+
+        return quantize_static(model, qparams)
+
+    return model
@@ -0,0 +1,45 @@
+import importlib
+
+# every model version the cli knows, in the order they're loaded and ensembled; a version's code is only imported
+# once it's selected with --models, so running one model doesn't pay for importing the others
+MODELS = {
+    'v7': {
+        'module': 'v7.libft2gan.frame_transformer4',
+        'class': 'FrameTransformerGenerator',
+        'checkpoint': 'model.v7.pth',
+        'config': dict(in_channels=2, out_channels=2, channels=8, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=2)
+    },
+    'v8': {
+        'module': 'v8.libft2gan.frame_transformer5',
+        'class': 'FrameTransformer',
+        'checkpoint': 'model.v8.pth',
+        'config': dict(in_channels=2, out_channels=2, channels=8, expansion=2.2, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1)
+    },
+    'v9': {
+        'module': 'v9r.libft2gan.frame_transformer12',
+        'class': 'FrameTransformer',
+        'checkpoint': 'model.v9.pth',
+        'config': dict(in_channels=10, out_channels=2, channels=16, expansion=512, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1, num_layers=17)
+    },
+    'v10': {
+        'module': 'v10.libft2gan.frame_transformer13',
+        'class': 'FrameTransformer',
+        'checkpoint': 'model.v10.pth',
+        'config': dict(in_channels=2, out_channels=2, embedding=8, expansion=4, n_fft=2048, dropout=0, num_heads=8, num_attention_maps=1)
+    }
+}
+
+def selected(models):
+    # --models can list versions in any order, but they always load and ensemble in registry order
+    unknown = [m for m in models if m not in MODELS]
+    if unknown:
+        raise ValueError(f'unknown model {", ".join(unknown)}, expected one of {", ".join(MODELS)}')
+
+    return [m for m in MODELS if m in models]
+
+def model_class(name):
+    entry = MODELS[name]
+    return getattr(importlib.import_module(entry['module']), entry['class'])
+
+def build(name):
+    return model_class(name)(**MODELS[name]['config'])
@@ -1,9 +1,12 @@
+import functools
+import itertools
 import os
 
-import librosa
 import numpy as np
 import soundfile as sf
 
+from lib import audio_io
+
 
 def crop_center(h1, h2):
     h1_shape = h1.size()
@@ -23,17 +26,80 @@ def crop_center(h1, h2):
     return h1
 
 
-def wave_to_spectrogram(wave, hop_length, n_fft):
-    wave_left = np.asfortranarray(wave[0])
-    wave_right = np.asfortranarray(wave[1])
+@functools.lru_cache(maxsize=None)
+def hann_window(n_fft):
+    # periodic hann, the window librosa uses for 'hann'; cached and read-only since every call shares it
+    window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(n_fft) / n_fft)).astype(np.float32)
+    window.setflags(write=False)
+
+    return window
+
 
-    spec_left = librosa.stft(wave_left, n_fft, hop_length=hop_length)
-    spec_right = librosa.stft(wave_right, n_fft, hop_length=hop_length)
-    spec = np.asfortranarray([spec_left, spec_right])
+def stft(wave, hop_length=1024, n_fft=2048, center=True, pad_mode='constant', block_frames=1024):
+    # librosa.stft over the last axis, but every leading axis (channels, clips) goes through each fft call together;
+    # (..., samples) float32 -> (..., n_fft // 2 + 1, frames) complex64
+    wave = np.asarray(wave, dtype=np.float32)
+    if center:
+        wave = np.pad(wave, [(0, 0)] * (wave.ndim - 1) + [(n_fft // 2, n_fft // 2)], mode=pad_mode)
+
+    n_frames = max(1 + (wave.shape[-1] - n_fft) // hop_length, 0)
+    frames = np.lib.stride_tricks.sliding_window_view(wave, n_fft, axis=-1)[..., ::hop_length, :][..., :n_frames, :]
+    window = hann_window(n_fft)
+
+    spec = np.empty(wave.shape[:-1] + (n_fft // 2 + 1, n_frames), dtype=np.complex64)
+    # a block of frames at a time keeps the windowed copy small whatever the track length
+    for start in range(0, n_frames, block_frames):
+        block = np.fft.rfft(frames[..., start:start + block_frames, :] * window, axis=-1)
+        spec[..., start:start + block_frames] = np.swapaxes(block, -1, -2)
 
     return spec
 
 
+def _overlap_add(frames, hop_length, size):
+    # frames (..., n_fft, n_frames); when hop divides n_fft every frame's r-th hop-sized segment lands on a
+    # contiguous run of the output, so the sum is n_fft // hop slice adds instead of one per frame
+    n_fft, n_frames = frames.shape[-2], frames.shape[-1]
+    out = np.zeros(frames.shape[:-2] + (size,), dtype=np.float32)
+
+    if n_fft % hop_length == 0:
+        segments = frames.reshape(frames.shape[:-2] + (n_fft // hop_length, hop_length, n_frames))
+
+        for r in range(n_fft // hop_length):
+            out[..., r * hop_length:(r + n_frames) * hop_length] += np.swapaxes(segments[..., r, :, :], -1, -2).reshape(frames.shape[:-2] + (n_frames * hop_length,))
+    else:
+        for i in range(n_frames):
+            out[..., i * hop_length:i * hop_length + n_fft] += frames[..., :, i]
+
+    return out
+
+
+def istft(spec, hop_length=1024, center=True, block_frames=1024):
+    # librosa.istft over the last two axes, batched over the rest; (..., bins, frames) -> (..., samples) float32
+    n_fft = 2 * (spec.shape[-2] - 1)
+    n_frames = spec.shape[-1]
+    window = hann_window(n_fft)
+    size = n_fft + hop_length * (n_frames - 1)
+
+    frames = np.empty(spec.shape[:-2] + (n_fft, n_frames), dtype=np.float32)
+    for start in range(0, n_frames, block_frames):
+        frames[..., start:start + block_frames] = np.fft.irfft(spec[..., start:start + block_frames], n=n_fft, axis=-2) * window[:, None]
+
+    wave = _overlap_add(frames, hop_length, size)
+    norm = _overlap_add(np.broadcast_to(np.square(window)[:, None], (n_fft, n_frames)), hop_length, size)
+    nonzero = norm > np.finfo(np.float32).tiny
+    wave[..., nonzero] /= norm[nonzero]
+
+    if center:
+        wave = wave[..., n_fft // 2:-(n_fft // 2)]
+
+    return wave
+
+
+def wave_to_spectrogram(wave, hop_length, n_fft):
+    # reflect padding is what librosa.stft defaulted to before 0.10, which the old per-channel calls relied on
+    return stft(wave[:2], hop_length, n_fft, pad_mode='reflect')
+
+
 def spectrogram_to_image(spec, mode='magnitude'):
     if mode == 'magnitude':
         if np.iscomplexobj(spec):
@@ -109,6 +175,9 @@ def merge_artifacts(y_mask, thres=0.05, min_range=64, fade_size=32):
 
 
 def align_wave_head_and_tail(a, b, sr):
+    # only dataset building aligns tracks, so librosa isn't loaded unless it's needed
+    import librosa
+
     a, _ = librosa.effects.trim(a)
     b, _ = librosa.effects.trim(b)
 
@@ -144,15 +213,13 @@ def to_spec(X, Y, hop_length=1024, n_fft=2048, sr=44100, va=False):
     return X, Y
 
 def load_wave(mix_path, inst_path, sr=44100, device=None):
-    X, _ = librosa.load(
-        mix_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
+    X, _ = audio_io.load(mix_path, sr)
 
     if X.ndim == 1:
         X = np.array([X, X])
 
     if mix_path != inst_path:
-        Y, _ = librosa.load(
-            inst_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
+        Y, _ = audio_io.load(inst_path, sr)
 
         if Y.ndim == 1:
             Y = np.array([Y, Y])
@@ -180,10 +247,8 @@ def cache_or_load(mix_path, inst_path, sr, hop_length, n_fft):
         X = np.load(mix_cache_path)
         y = np.load(inst_cache_path)
     else:
-        X, _ = librosa.load(
-            mix_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
-        y, _ = librosa.load(
-            inst_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
+        X, _ = audio_io.load(mix_path, sr)
+        y, _ = audio_io.load(inst_path, sr)
 
         X, y = align_wave_head_and_tail(X, y, sr)
 
@@ -202,15 +267,13 @@ def load(mix_path, inst_path, sr, hop_length, n_fft):
     os.makedirs(mix_cache_dir, exist_ok=True)
     os.makedirs(inst_cache_dir, exist_ok=True)
 
-    X, _ = librosa.load(
-        mix_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
+    X, _ = audio_io.load(mix_path, sr)
 
     if X.ndim == 1:
         X = np.array([X, X])
 
     if mix_path != inst_path:
-        y, _ = librosa.load(
-            inst_path, sr, False, dtype=np.float32, res_type='kaiser_fast')
+        y, _ = audio_io.load(inst_path, sr)
 
         if y.ndim == 1:
             y = np.array([y, y])
@@ -225,18 +288,99 @@ def load(mix_path, inst_path, sr, hop_length, n_fft):
     return X, y
 
 
-def spectrogram_to_wave(spec, hop_length=1024):
-    if spec.ndim == 2:
-        wave = librosa.istft(spec, hop_length=hop_length)
-    elif spec.ndim == 3:
-        spec_left = np.asfortranarray(spec[0])
-        spec_right = np.asfortranarray(spec[1])
+def stream_wave(path, sr=44100, block_size=262144):
+    return audio_io.stream(path, sr, block_size)
 
-        wave_left = librosa.istft(spec_left, hop_length=hop_length)
-        wave_right = librosa.istft(spec_right, hop_length=hop_length)
-        wave = np.asfortranarray([wave_left, wave_right])
 
-    return wave
+def stream_spectrogram(blocks, hop_length, n_fft):
+    # frames match wave_to_spectrogram: centered with n_fft // 2 samples reflected at both ends, so nothing is emitted
+    # until n_fft // 2 + 1 samples are in and the last n_fft // 2 + 1 samples are kept to reflect the tail from
+    pad = n_fft // 2
+    blocks = iter(blocks)
+    head = np.zeros((2, 0), dtype=np.float32)
+
+    while head.shape[1] <= pad:
+        block = next(blocks, None)
+
+        if block is None:
+            # shorter than the padding, reflect it the way np.pad does and be done
+            if head.shape[1] > 0:
+                yield wave_to_spectrogram(head, hop_length, n_fft)
+            return
+
+        head = np.concatenate((head, block), axis=1)
+
+    buffer = np.concatenate((head[:, pad:0:-1], head), axis=1)
+    tail = head[:, -(pad + 1):]
+
+    for block in itertools.chain(blocks, [None]):
+        if block is None:
+            block = tail[:, -2:-(pad + 2):-1]
+        else:
+            tail = np.concatenate((tail, block), axis=1)[:, -(pad + 1):]
+
+        buffer = np.concatenate((buffer, block), axis=1)
+        n_frames = (buffer.shape[1] - n_fft) // hop_length + 1
+
+        if n_frames > 0:
+            wave = buffer[:, :(n_frames - 1) * hop_length + n_fft]
+            buffer = buffer[:, n_frames * hop_length:]
+
+            yield stft(wave, hop_length, n_fft, center=False)
+
+
+class StreamingISTFT(object):
+    def __init__(self, hop_length=1024, n_fft=2048):
+        self.hop_length = hop_length
+        self.n_fft = n_fft
+        self.window = hann_window(n_fft)
+        self.tail = np.zeros((2, n_fft - hop_length), dtype=np.float32)
+        self.tail_norm = np.zeros(n_fft - hop_length, dtype=np.float32)
+        self.trim = n_fft // 2
+
+    def __call__(self, spec):
+        n_frames = spec.shape[2]
+        frames = np.fft.irfft(spec, n=self.n_fft, axis=1).astype(np.float32) * self.window[:, None]
+        win_sq = self.window ** 2
+
+        size = n_frames * self.hop_length + self.tail.shape[1]
+        wave = np.zeros((2, size), dtype=np.float32)
+        norm = np.zeros(size, dtype=np.float32)
+        wave[:, :self.tail.shape[1]] = self.tail
+        norm[:self.tail.shape[1]] = self.tail_norm
+
+        for i in range(n_frames):
+            start = i * self.hop_length
+            wave[:, start:start + self.n_fft] += frames[:, :, i]
+            norm[start:start + self.n_fft] += win_sq
+
+        # samples before the next frame's start can no longer change
+        done = n_frames * self.hop_length
+        self.tail, self.tail_norm = wave[:, done:], norm[done:]
+
+        return self._emit(wave[:, :done], norm[:done])
+
+    def flush(self):
+        # drop the trailing n_fft // 2 samples of center padding, as librosa.istft does
+        keep = max(self.tail.shape[1] - self.n_fft // 2, 0)
+        wave = self._emit(self.tail[:, :keep], self.tail_norm[:keep])
+        self.tail = self.tail[:, :0]
+        self.tail_norm = self.tail_norm[:0]
+
+        return wave
+
+    def _emit(self, wave, norm):
+        nonzero = norm > np.finfo(np.float32).tiny
+        wave[:, nonzero] /= norm[nonzero]
+
+        trim = min(self.trim, wave.shape[1])
+        self.trim -= trim
+
+        return wave[:, trim:]
+
+
+def spectrogram_to_wave(spec, hop_length=1024):
+    return istft(spec, hop_length)
 
 
 if __name__ == "__main__":
@@ -253,10 +397,8 @@ if __name__ == "__main__":
         np.zeros((bins - stable_bins, 1))
     ], axis=0) * 0.2
 
-    X, _ = librosa.load(
-        sys.argv[1], 44100, False, dtype=np.float32, res_type='kaiser_fast')
-    y, _ = librosa.load(
-        sys.argv[2], 44100, False, dtype=np.float32, res_type='kaiser_fast')
+    X, _ = audio_io.load(sys.argv[1], 44100)
+    y, _ = audio_io.load(sys.argv[2], 44100)
 
     X, y = align_wave_head_and_tail(X, y, 44100)
     X_spec = wave_to_spectrogram(X, 1024, 2048)
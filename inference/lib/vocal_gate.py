@@ -0,0 +1,97 @@
+import json
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from lib import checkpoints
+
+class ResBlock(nn.Module):
+    def __init__(self, in_features):
+        super().__init__()
+
+        self.dropout = nn.Dropout(0.1)
+        self.norm = nn.InstanceNorm1d(1)
+        self.linear1 = nn.Linear(in_features, in_features * 4)
+        self.linear2 = nn.Linear(in_features * 4, in_features)
+
+    def __call__(self, x):
+        h = self.norm(x)
+        h = self.linear2(torch.relu(self.linear1(h)) ** 2)
+        return x + self.dropout(h)
+
+class VocalDetector(nn.Module):
+    # same network as vocal_detector.py at the repo root, so its voxdetector.pth checkpoints load as is
+    def __init__(self, in_features=8, latent_features=128, num_layers=16):
+        super().__init__()
+
+        self.in_project = nn.Linear(in_features, latent_features)
+        self.layers = nn.Sequential(*[ResBlock(latent_features) for _ in range(num_layers)])
+        self.out = nn.Sequential(
+            nn.InstanceNorm1d(1),
+            nn.Linear(latent_features, 1))
+
+    def __call__(self, x):
+        h = self.in_project(x).unsqueeze(1)
+        h = self.layers(h)
+        return self.out(h).squeeze(1)
+
+def lower_median(x):
+    # torch.median's convention, which vox_detect.py trained on: the lower of the two middle values for even counts,
+    # where np.median would average them
+    k = (x.shape[1] - 1) // 2
+    return np.partition(x, k, axis=1)[:, k]
+
+def crop_features(X_mag, mask, frames):
+    # the eight statistics vox_detect.py feeds the detector, one row per crop of the given width:
+    # min, mean, var and median of the vocal residual X * (1 - mask), then min, mean, max and median of the mask
+    n_frame = X_mag.shape[2]
+    crops = -(-n_frame // frames)
+    pad = crops * frames - n_frame
+
+    X = np.pad(X_mag[:, :mask.shape[1]], ((0, 0), (0, 0), (0, pad)), mode='edge')
+    m = np.pad(mask, ((0, 0), (0, 0), (0, pad)), mode='edge').astype(np.float32, copy=False)
+    X = X.reshape(X.shape[0], X.shape[1], crops, frames).transpose(2, 0, 1, 3).reshape(crops, -1)
+    m = m.reshape(m.shape[0], m.shape[1], crops, frames).transpose(2, 0, 1, 3).reshape(crops, -1)
+    v = X * (1 - m)
+
+    return np.stack([
+        v.min(axis=1), v.mean(axis=1), v.var(axis=1, ddof=1), lower_median(v),
+        m.min(axis=1), m.mean(axis=1), m.max(axis=1), lower_median(m)
+    ], axis=1).astype(np.float32)
+
+def load_calibration(path):
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f'no vocal gate calibration at {path}, run vocal_gate.py --calibrate or pass --vocal_gate_threshold')
+
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_calibration(path, calibration):
+    with open(path, 'w') as f:
+        json.dump(calibration, f, indent=2)
+
+class VocalGate(object):
+    # scores the first model's mask crop by crop; crops the detector calls vocal-free are passed through as
+    # instruments and the rest of the ensemble never runs on them. the first model always runs in full, so the gate
+    # only saves anything with two or more models
+    def __init__(self, path, device, threshold, frames=256, latent_features=1024, num_layers=24):
+        self.detector = checkpoints.load_model(lambda: VocalDetector(latent_features=latent_features, num_layers=num_layers), path, device)
+        self.detector.eval()
+        self.device = device
+        self.threshold = threshold
+        self.frames = frames
+
+    def scores(self, X_mag, mask):
+        # X_mag normalized like the separator's input, mask without the padded top bin
+        features = torch.from_numpy(crop_features(X_mag, mask, self.frames)).to(self.device)
+
+        with torch.no_grad():
+            return torch.sigmoid(self.detector(features)).squeeze(-1).float().cpu().numpy()
+
+    def vocal_free(self, X_mag, mask):
+        # per frame, so models with other crop sizes can tell which of their crops are entirely covered
+        free = self.scores(X_mag, mask) < self.threshold
+
+        return np.repeat(free, self.frames)[:X_mag.shape[2]]
@@ -0,0 +1,135 @@
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+import inference
+from lib import audio_io
+from lib import quantization
+from lib import registry
+from lib import spec_utils
+
+def list_files(path):
+    if not os.path.isdir(path):
+        return [path]
+
+    extensions = ['wav', 'm4a', 'mp3', 'mp4', 'flac', 'ogg']
+    return sorted([os.path.join(path, f) for f in os.listdir(path) if f[::-1].split('.')[0][::-1] in extensions])
+
+def model_names(args):
+    return registry.selected(args.models)
+
+def sdr(reference, estimate, eps=1e-10):
+    n = min(reference.shape[-1], estimate.shape[-1])
+    reference = reference[..., :n]
+    estimate = estimate[..., :n]
+
+    return 10 * np.log10((np.sum(reference ** 2) + eps) / (np.sum((reference - estimate) ** 2) + eps))
+
+def calibrate(files, args):
+    # ranges are gathered on the fp32 models, so calibration always loads them unquantized
+    args = copy.copy(args)
+    args.quantize = 'none'
+    device, models, _ = inference.load_models(args)
+
+    for model in models:
+        quantization.prepare_calibration(model)
+
+    for file in files:
+        print(f'\ncalibrating on {file}')
+        X_spec, _, _ = inference.load_track(file, args)
+
+        if args.calibration_frames > 0:
+            X_spec = X_spec[:, :, :args.calibration_frames]
+
+        inference.separate_track(X_spec, models, device, args)
+
+    calibration = { name: quantization.calibration_qparams(model) for name, model in zip(model_names(args), models) }
+    quantization.save_calibration(args.quantize_calibration, calibration)
+    print(f'\nwrote calibration for {", ".join(calibration.keys())} to {args.quantize_calibration}')
+
+def separate_files(files, args, mode):
+    args = copy.copy(args)
+    args.quantize = mode
+    device, models, _ = inference.load_models(args)
+
+    results = {}
+    for file in files:
+        X_spec, _, _ = inference.load_track(file, args)
+
+        start = time.perf_counter()
+        y_spec, _ = inference.separate_track(X_spec, models, device, args)
+        elapsed = time.perf_counter() - start
+
+        wave = spec_utils.spectrogram_to_wave(y_spec, hop_length=args.hop_length)
+        results[file] = { 'seconds': elapsed, 'duration': wave.shape[-1] / args.sr, 'wave': wave }
+
+    return results
+
+def report(files, args):
+    modes = ['none', 'dynamic'] + (['static'] if os.path.isfile(args.quantize_calibration) else [])
+    results = { mode: separate_files(files, args, mode) for mode in modes }
+
+    rows = []
+    for mode in modes:
+        seconds = sum(r['seconds'] for r in results[mode].values())
+        duration = sum(r['duration'] for r in results[mode].values())
+        row = { 'mode': 'fp32' if mode == 'none' else mode, 'seconds': seconds, 'rtf': seconds / duration, 'speedup': sum(r['seconds'] for r in results['none'].values()) / seconds }
+
+        # sdr against the fp32 output isolates what quantization costs; against references it's comparable to the usual scores
+        row['sdr_vs_fp32'] = float(np.mean([sdr(results['none'][f]['wave'], results[mode][f]['wave']) for f in files])) if mode != 'none' else None
+
+        if args.reference != '':
+            scores = []
+            for f in files:
+                reference = os.path.join(args.reference, os.path.basename(f))
+                if os.path.isfile(reference):
+                    Y, _ = audio_io.load_stereo(reference, args.sr)
+                    scores.append(sdr(Y, results[mode][f]['wave']))
+
+            row['sdr_vs_reference'] = float(np.mean(scores)) if scores else None
+
+        rows.append(row)
+
+    print(f'\n{len(files)} files, models {",".join(args.models)}, cropsize {args.cropsize}, batchsize {args.batchsize}')
+    print(f'{"mode":<8} {"seconds":>9} {"rtf":>7} {"speedup":>8} {"sdr/fp32":>9} {"sdr/ref":>8}')
+    for row in rows:
+        sdr_fp32 = f'{row["sdr_vs_fp32"]:.2f}' if row['sdr_vs_fp32'] is not None else '-'
+        sdr_ref = f'{row["sdr_vs_reference"]:.2f}' if row.get('sdr_vs_reference') is not None else '-'
+        print(f'{row["mode"]:<8} {row["seconds"]:9.2f} {row["rtf"]:7.3f} {row["speedup"]:7.2f}x {sdr_fp32:>9} {sdr_ref:>8}')
+
+    if args.report_output != '':
+        with open(args.report_output, 'w') as f:
+            json.dump({ 'files': files, 'models': args.models, 'cropsize': args.cropsize, 'batchsize': args.batchsize, 'results': rows }, f, indent=2)
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--input', '-i', required=True) # calibration tracks, or the test set for --report
+    p.add_argument('--calibrate', action='store_true')
+    p.add_argument('--calibration_frames', type=int, default=2048) # frames used from each calibration track, 0 for all
+    p.add_argument('--report', action='store_true') # compare speed and sdr of fp32, dynamic and (if calibrated) static
+    p.add_argument('--reference', type=str, default='') # folder of reference instrumentals named like the inputs
+    p.add_argument('--report_output', type=str, default='') # also write the report as json
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+
+    # nothing here writes tracks or reads cached masks
+    args.mask_cache = ''
+    args.stream = False
+    args.autotune = 'off' # every mode is compared at the same settings
+
+    if not args.calibrate and not args.report:
+        p.error('nothing to do, pass --calibrate and/or --report')
+
+    files = list_files(args.input)
+
+    if args.calibrate:
+        calibrate(files, args)
+
+    if args.report:
+        report(files, args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import copy
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import inference
+from lib.batching import PatchBatcher
+
+# fields a job may override; everything else comes from the server's command line
+JOB_OPTIONS = ['output', 'output_format', 'create_vocals', 'create_webm', 'postprocess', 'model_in_filename']
+
+class JobQueue(object):
+    def __init__(self, models, device, args, cache=None, workers=1, batchers=None):
+        self.models = models
+        self.device = device
+        self.args = args
+        self.cache = cache
+        self.batchers = batchers
+        self.timer = inference.StageTimer()
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.workers = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, request):
+        if 'input' not in request:
+            raise ValueError('job needs an input path')
+
+        if not os.path.isfile(request['input']):
+            raise ValueError(f'input not found: {request["input"]}')
+
+        unknown = [k for k in request if k != 'input' and k not in JOB_OPTIONS]
+        if unknown:
+            raise ValueError(f'unknown job options: {", ".join(unknown)}')
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': 'queued',
+            'input': request['input'],
+            'options': { k: v for k, v in request.items() if k in JOB_OPTIONS },
+            'outputs': [],
+            'error': None,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None
+        }
+
+        with self.lock:
+            self.jobs[job['id']] = job
+
+        self.pending.put(job['id'])
+
+        return self.get(job['id'])
+
+    def get(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return copy.deepcopy(job) if job is not None else None
+
+    def list(self):
+        with self.lock:
+            return [copy.deepcopy(job) for job in self.jobs.values()]
+
+    def stats(self):
+        with self.lock:
+            counts = {}
+            for job in self.jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+
+        stats = { 'jobs': counts, 'queued': self.pending.qsize(), 'workers': len(self.workers), 'stage_seconds': dict(self.timer.totals) }
+        if self.batchers is not None:
+            stats['batching'] = { model.model_name: batcher.stats() for model, batcher in zip(self.models, self.batchers) }
+
+        return stats
+
+    def _update(self, job_id, **fields):
+        with self.lock:
+            self.jobs[job_id].update(fields)
+
+    def _run(self):
+        # without batchers, workers share the resident models directly, so more than one only helps overlap decoding and writing
+        while True:
+            job_id = self.pending.get()
+            job = self.get(job_id)
+            self._update(job_id, status='running', started=time.time())
+
+            args = copy.copy(self.args)
+            for k, v in job['options'].items():
+                setattr(args, k, v)
+
+            args.output_format = args.output_format.lower()
+            if args.output_format not in ["flac", "wav", "mp3"]:
+                args.output_format = "flac"
+
+            try:
+                if args.output != '':
+                    os.makedirs(args.output, exist_ok=True)
+
+                outputs = inference.process_file(job['input'], self.models, self.device, args, self.timer, cache=self.cache, batchers=self.batchers)
+                self._update(job_id, status='done', outputs=[o for o in outputs if o is not None], finished=time.time())
+            except Exception as e:
+                traceback.print_exc()
+                self._update(job_id, status='failed', error=f'{type(e).__name__}: {e}', finished=time.time())
+
+class JobHandler(BaseHTTPRequestHandler):
+    jobs = None
+
+    def address_string(self):
+        # unix socket peers have no host/port
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+
+        if path == '/health':
+            self._send(200, { 'status': 'ok', 'models': self.jobs.args.models })
+        elif path == '/stats':
+            self._send(200, self.jobs.stats())
+        elif path == '/jobs':
+            self._send(200, self.jobs.list())
+        elif path.startswith('/jobs/'):
+            job = self.jobs.get(path[len('/jobs/'):])
+            if job is None:
+                self._send(404, { 'error': 'no such job' })
+            else:
+                self._send(200, job)
+        else:
+            self._send(404, { 'error': 'not found' })
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send(404, { 'error': 'not found' })
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('request body must be a json object')
+
+            self._send(202, self.jobs.submit(request))
+        except ValueError as e:
+            self._send(400, { 'error': str(e) })
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--host', type=str, default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--socket', type=str, default='') # serve on a unix socket instead of tcp
+    p.add_argument('--job_workers', type=int, default=4) # jobs preprocessed and separated concurrently, batches only span jobs when this is above 1
+    p.add_argument('--max_batch', type=int, default=8) # patches packed into one forward pass across jobs, 0 to disable
+    p.add_argument('--max_wait_ms', type=float, default=10) # how long the oldest patch waits for a batch to fill
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+    args.explicit = inference.explicit_options(p)
+
+    # the server doesn't expand folders, so these only apply to the cli
+    args.pipeline = False
+    args.rename_dir = False
+
+    device, models, cache = inference.load_models(args)
+
+    batchers = None
+    if args.max_batch > 0:
+        batchers = [PatchBatcher(inference.Separator(model, device, args.max_batch, args.cropsize, 2048, precision=args.precision)._forward, args.max_batch, args.max_wait_ms / 1000) for model in models]
+
+    JobHandler.jobs = JobQueue(models, device, args, cache, args.job_workers, batchers)
+
+    if args.socket != '':
+        if os.path.exists(args.socket):
+            os.remove(args.socket)
+
+        server = ThreadingUnixHTTPServer(args.socket, JobHandler)
+        print(f'serving on unix socket {args.socket}')
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), JobHandler)
+        print(f'serving on http://{args.host}:{args.port}')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
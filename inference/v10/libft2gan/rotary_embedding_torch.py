@@ -56,10 +56,11 @@ def broadcat(tensors, dim = -1):
 # rotary embedding helper functions
 
 def rotate_half(x):
-    x = rearrange(x, '... (d r) -> ... d r', r = 2)
+    # unflatten/flatten rather than rearrange so traced exports keep the frame axis dynamic
+    x = x.unflatten(-1, (-1, 2))
     x1, x2 = x.unbind(dim = -1)
     x = torch.stack((-x2, x1), dim = -1)
-    return rearrange(x, '... d r -> ... (d r)')
+    return x.flatten(-2)
 
 def apply_rotary_emb(freqs, t, start_index = 0):
     freqs = freqs.to(t)
@@ -109,7 +110,8 @@ class RotaryEmbedding(nn.Module):
     def rotate_queries_or_keys(self, t, seq_dim = -2):
         device = t.device
         seq_len = t.shape[seq_dim]
-        freqs = self.forward(lambda: torch.arange(seq_len, device = device), cache_key = seq_len)
+        # the cache would bake the traced sequence length into an exported graph
+        freqs = self.forward(lambda: torch.arange(seq_len, device = device), cache_key = seq_len if not torch.jit.is_tracing() else None)
         return apply_rotary_emb(freqs, t)
 
     def forward(self, t, cache_key = None):
@@ -122,7 +124,7 @@ class RotaryEmbedding(nn.Module):
         freqs = self.freqs
 
         freqs = torch.einsum('..., f -> ... f', t.type(freqs.dtype), freqs)
-        freqs = repeat(freqs, '... n -> ... (n r)', r = 2)
+        freqs = freqs.repeat_interleave(2, dim = -1)
 
         if not self.learned_freq and exists(cache_key):
             self.cache[cache_key] = freqs
@@ -24,6 +24,7 @@ class MultichannelLayerNorm(nn.Module):
             xi = (torch.layer_norm(xi.transpose(2,3), (self.weight.shape[-1],), eps=self.eps) * self.weight + self.bias).transpose(2,3)
             return torch.complex(xr, xi)
         
-        x = (torch.layer_norm(x.transpose(2,3), (self.weight.shape[-1],), eps=self.eps) * self.weight + self.bias).transpose(2,3)
+        # always normalized in fp32, eps is below half precision resolution
+        x = (torch.layer_norm(x.float().transpose(2,3), (self.weight.shape[-1],), eps=self.eps) * self.weight + self.bias).transpose(2,3)
 
         return x
\ No newline at end of file
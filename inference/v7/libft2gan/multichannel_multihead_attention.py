@@ -38,7 +38,7 @@ class MultichannelMultiheadAttention(nn.Module):
         if prev_qk is not None:
             qk = qk + prev_qk
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(2,3).reshape(b,c,w,-1).transpose(2,3)
+        a = torch.matmul(F.softmax(qk, dim=-1, dtype=torch.float32),v).transpose(2,3).reshape(b,c,w,-1).transpose(2,3)
         x = self.o_proj(a)
 
         return x, qk
@@ -76,7 +76,7 @@ class MultichannelMultiheadAttention2(nn.Module):
         if prev_qk is not None:
             qk = qk + prev_qk
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
+        a = torch.matmul(F.softmax(qk, dim=-1, dtype=torch.float32),v).transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
         x = self.o_proj(torch.cat((x, self.o_linear(a)), dim=1))
 
         return x, qk
@@ -28,7 +28,7 @@ class ConvolutionalMultiheadAttention(nn.Module):
         if prev_qk is not None:
             qk = qk + prev_qk
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(1,2).reshape(b,h,w,c).permute(0,3,1,2)
+        a = torch.matmul(F.softmax(qk, dim=-1, dtype=torch.float32),v).transpose(1,2).reshape(b,h,w,c).permute(0,3,1,2)
         x = self.o_proj(a)
 
         return x, qk
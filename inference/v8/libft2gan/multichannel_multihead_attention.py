@@ -39,7 +39,7 @@ class MultichannelMultiheadAttention(nn.Module):
         if prev_qk is not None:
             qk = qk + prev_qk
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
+        a = torch.matmul(F.softmax(qk, dim=-1, dtype=torch.float32),v).transpose(2,3).reshape(b,self.attention_maps,w,-1).transpose(2,3)
         out = self.o_proj(a)
 
         return out, qk
\ No newline at end of file
@@ -151,7 +151,7 @@ class MultichannelMultiheadAttention(nn.Module):
         if prev_qk is not None:
             qk = qk + prev_qk
 
-        a = torch.matmul(F.softmax(qk, dim=-1),v).transpose(2,3).reshape(b,c,l,ch,cw)
+        a = torch.matmul(F.softmax(qk, dim=-1, dtype=torch.float32),v).transpose(2,3).reshape(b,c,l,ch,cw)
         
         out = self.o_proj(a.transpose(1,2).reshape((b*l,c,ch,cw))).reshape((b,l,c,ch,cw)).transpose(1,2)
 
@@ -0,0 +1,155 @@
+import copy
+import json
+import os
+import time
+
+import numpy as np
+
+import inference
+from lib import ensemble
+from lib import spec_utils
+from lib import vocal_gate
+from quantize import list_files, sdr
+
+def vocal_ratio(X_mag, mask, frames):
+    # share of each crop's energy that the full ensemble sends to the vocals, the ground truth the gate is calibrated on
+    n_frame = X_mag.shape[2]
+    crops = -(-n_frame // frames)
+    total = np.zeros(crops)
+    vocal = np.zeros(crops)
+
+    for i in range(crops):
+        X = X_mag[:, :, i * frames:(i + 1) * frames]
+        total[i] = np.sum(X ** 2)
+        vocal[i] = np.sum(((1 - mask[:, :, i * frames:(i + 1) * frames]) * X) ** 2)
+
+    return vocal / np.maximum(total, 1e-10)
+
+def calibrate(files, args):
+    # the ungated ensemble decides which crops really are vocal-free; the threshold is the highest score that keeps
+    # the share of vocal crops among those skipped under --max_false_skip
+    args = copy.copy(args)
+    args.vocal_gate = ''
+    device, models, _ = inference.load_models(args)
+    gate = vocal_gate.VocalGate(args.detector, device, 1, args.vocal_gate_frames)
+
+    scores = []
+    vocal = []
+    for file in files:
+        print(f'\nscoring {file}')
+        X_spec, _, _ = inference.load_track(file, args)
+        X_mag = np.abs(X_spec)
+
+        masks = []
+        for model in models:
+            cropsize, padding, batchsize = inference.model_settings(model, args)
+            sp = inference.Separator(model, device, batchsize, cropsize, 2048, autoregressive=model.autoregressive, precision=args.precision)
+            masks.append(sp.separate_mask(X_mag, padding=padding))
+
+        mask = ensemble.reduce_masks(masks, args.ensemble, args.ensemble_weights)
+        scores.append(gate.scores(X_mag / X_mag.max(), masks[0][:, :-1]))
+        vocal.append(vocal_ratio(X_mag, mask, args.vocal_gate_frames) > args.vocal_tolerance)
+
+    scores = np.concatenate(scores)
+    vocal = np.concatenate(vocal)
+
+    threshold = 0
+    for t in np.unique(scores):
+        skipped = scores < t
+        if skipped.sum() > 0 and vocal[skipped].mean() > args.max_false_skip:
+            break
+
+        threshold = float(t)
+
+    skipped = scores < threshold
+    calibration = {
+        'threshold': threshold,
+        'detector': os.path.abspath(args.detector),
+        'frames': args.vocal_gate_frames,
+        'models': args.models,
+        'crops': int(len(scores)),
+        'skip_rate': float(skipped.mean()),
+        'false_skip_rate': float(vocal[skipped].mean()) if skipped.any() else 0.0,
+        'vocal_tolerance': args.vocal_tolerance
+    }
+
+    vocal_gate.save_calibration(args.vocal_gate_calibration, calibration)
+    print(f'\nthreshold {threshold:.4f}: skips {calibration["skip_rate"] * 100:.1f}% of {len(scores)} crops, {calibration["false_skip_rate"] * 100:.2f}% of them with vocals')
+    print(f'wrote {args.vocal_gate_calibration}')
+
+def separate_files(files, args, gated):
+    args = copy.copy(args)
+    args.vocal_gate = args.detector if gated else ''
+    device, models, _ = inference.load_models(args)
+
+    results = {}
+    for file in files:
+        X_spec, _, _ = inference.load_track(file, args)
+
+        start = time.perf_counter()
+        y_spec, _ = inference.separate_track(X_spec, models, device, args)
+        elapsed = time.perf_counter() - start
+
+        wave = spec_utils.spectrogram_to_wave(y_spec, hop_length=args.hop_length)
+        results[file] = { 'seconds': elapsed, 'duration': wave.shape[-1] / args.sr, 'wave': wave }
+
+    return results
+
+def report(files, args):
+    if args.vocal_gate_threshold <= 0:
+        args.vocal_gate_threshold = vocal_gate.load_calibration(args.vocal_gate_calibration)['threshold']
+
+    ungated = separate_files(files, args, False)
+    gated = separate_files(files, args, True)
+
+    rows = []
+    for name, results in [('ungated', ungated), ('gated', gated)]:
+        seconds = sum(r['seconds'] for r in results.values())
+        duration = sum(r['duration'] for r in results.values())
+        rows.append({
+            'mode': name,
+            'seconds': seconds,
+            'rtf': seconds / duration,
+            'speedup': sum(r['seconds'] for r in ungated.values()) / seconds,
+            'sdr_vs_ungated': float(np.mean([sdr(ungated[f]['wave'], results[f]['wave']) for f in files])) if name == 'gated' else None
+        })
+
+    print(f'\n{len(files)} files, models {",".join(args.models)}, gate threshold {args.vocal_gate_threshold}')
+    print(f'{"mode":<8} {"seconds":>9} {"rtf":>7} {"speedup":>8} {"sdr/ungated":>12}')
+    for row in rows:
+        sdr_ungated = f'{row["sdr_vs_ungated"]:.2f}' if row['sdr_vs_ungated'] is not None else '-'
+        print(f'{row["mode"]:<8} {row["seconds"]:9.2f} {row["rtf"]:7.3f} {row["speedup"]:7.2f}x {sdr_ungated:>12}')
+
+    if args.report_output != '':
+        with open(args.report_output, 'w') as f:
+            json.dump({ 'files': files, 'models': args.models, 'threshold': args.vocal_gate_threshold, 'results': rows }, f, indent=2)
+
+def main():
+    p = inference.make_parser()
+    p.add_argument('--input', '-i', required=True) # calibration tracks, or the test set for --report
+    p.add_argument('--detector', type=str, default='voxdetector.pth') # VocalDetector checkpoint being calibrated
+    p.add_argument('--calibrate', action='store_true')
+    p.add_argument('--vocal_tolerance', type=float, default=0.01) # vocal energy share under which a crop counts as vocal-free
+    p.add_argument('--max_false_skip', type=float, default=0.02) # share of skipped crops allowed to contain vocals
+    p.add_argument('--report', action='store_true') # compare speed and sdr of the gated ensemble against the ungated one
+    p.add_argument('--report_output', type=str, default='') # also write the report as json
+    args = p.parse_args()
+    args.models = [model for model in args.models.split(',')]
+
+    args.mask_cache = ''
+    args.stream = False
+    args.autotune = 'off'
+
+    if not args.calibrate and not args.report:
+        p.error('nothing to do, pass --calibrate and/or --report')
+
+    files = list_files(args.input)
+
+    if args.calibrate:
+        calibrate(files, args)
+
+    if args.report:
+        report(files, args)
+
+if __name__ == '__main__':
+    main()
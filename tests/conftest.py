@@ -0,0 +1,16 @@
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# tests import the inference package the way its scripts do, with inference/ first on the path so `lib` is inference/lib
+sys.path.insert(0, os.path.join(ROOT, 'inference'))
+
+def load_module(relative_path, name):
+    # the repo keeps per-package copies of some modules under clashing names (lib/ and inference/lib/), load by path
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
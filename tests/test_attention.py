@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('einops')
+
+from conftest import ROOT
+
+def attention_classes():
+    from v10.libft2gan.multichannel_multihead_attention import MultichannelMultiheadAttention as V10Attention
+
+    # the training copy imports itself as libft2gan, from app/
+    sys.path.insert(0, os.path.join(ROOT, 'app'))
+    try:
+        from libft2gan.multichannel_multihead_attention import MultichannelMultiheadAttention as AppAttention
+    finally:
+        sys.path.remove(os.path.join(ROOT, 'app'))
+
+    return [V10Attention, AppAttention]
+
+def run_layers(attention, x, query_chunk_size, residual_dtype=None, layers=3):
+    # chained like the encoders, each layer gets the previous layer's residual scores
+    attention.query_chunk_size = query_chunk_size
+    attention.residual_dtype = residual_dtype
+    outputs, qk = [], None
+
+    for _ in range(layers):
+        out, qk = attention(x, prev_qk=qk)
+        outputs.append((out, qk))
+
+    return outputs
+
+@pytest.mark.parametrize('attention_class', attention_classes())
+@pytest.mark.parametrize('w,query_chunk_size', [(32, 8), (37, 8), (23, 5), (16, 15)])
+def test_chunked_attention_matches_dense(attention_class, w, query_chunk_size):
+    torch.manual_seed(0)
+    attention = attention_class(2, 2, 2, 16).eval()
+    x = torch.randn(1, 2, 16, w)
+
+    with torch.no_grad():
+        dense = run_layers(attention, x, None)
+        chunked = run_layers(attention, x, query_chunk_size)
+
+    for (dense_out, dense_qk), (out, qk) in zip(dense, chunked):
+        assert qk.shape == dense_qk.shape == (1, 2, 2, w, w)
+        torch.testing.assert_close(out, dense_out, atol=1e-5, rtol=1e-5)
+        torch.testing.assert_close(qk, dense_qk, atol=1e-5, rtol=1e-5)
+
+@pytest.mark.parametrize('attention_class', attention_classes())
+def test_chunked_attention_half_residual(attention_class):
+    torch.manual_seed(0)
+    attention = attention_class(2, 2, 2, 16).eval()
+    x = torch.randn(1, 2, 16, 37)
+
+    with torch.no_grad():
+        dense = run_layers(attention, x, None)
+        chunked = run_layers(attention, x, 8, torch.float16)
+
+    for (dense_out, dense_qk), (out, qk) in zip(dense, chunked):
+        assert qk.dtype == torch.float16
+        torch.testing.assert_close(out, dense_out, atol=1e-2, rtol=1e-2)
+        torch.testing.assert_close(qk.float(), dense_qk, atol=1e-2, rtol=1e-2)
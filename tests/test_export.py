@@ -0,0 +1,55 @@
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('einops')
+
+from lib import artifacts
+from v10.libft2gan.frame_transformer13 import FrameTransformer
+
+TOLERANCE = 1e-4
+
+@pytest.fixture(scope='module')
+def model():
+    # the v10 architecture at a size that traces and runs in a second; 64 bins, 32 frames per downsampling multiple
+    torch.manual_seed(0)
+    return FrameTransformer(in_channels=2, out_channels=2, embedding=2, dropout=0, n_fft=64, num_heads=2, expansion=1).eval()
+
+def mask(model, x):
+    with torch.no_grad():
+        return torch.sigmoid(model(x).float())
+
+def assert_matches_eager(model, artifact, frames):
+    x = artifacts.example_input(model, frames, 'cpu', batchsize=2)
+    torch.testing.assert_close(mask(artifact, x), mask(model, x), atol=TOLERANCE, rtol=0)
+
+def test_torchscript_fixed_frames(model, tmp_path):
+    path = str(tmp_path / 'model.pt')
+    artifacts.export_torchscript(model, path, 64, 'cpu', dynamic=False)
+    artifact = artifacts.load_artifact(path, 'cpu')
+
+    assert artifact.frames == 64
+    assert_matches_eager(model, artifact, 64)
+
+    with pytest.raises(ValueError):
+        artifact(artifacts.example_input(model, 96, 'cpu'))
+
+def test_torchscript_dynamic(model, tmp_path):
+    path = str(tmp_path / 'model.pt')
+    artifacts.export_torchscript(model, path, 64, 'cpu', dynamic=True)
+    artifact = artifacts.load_artifact(path, 'cpu')
+
+    assert artifact.frames is None
+    for frames in [64, 128]:
+        assert_matches_eager(model, artifact, frames)
+
+@pytest.mark.parametrize('dynamic', [False, True])
+def test_onnx(model, tmp_path, dynamic):
+    pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+
+    path = str(tmp_path / 'model.onnx')
+    artifacts.export_onnx(model, path, 64, 'cpu', dynamic=dynamic)
+    artifact = artifacts.load_artifact(path, 'cpu')
+
+    for frames in [64, 128] if dynamic else [64]:
+        assert_matches_eager(model, artifact, frames)
@@ -0,0 +1,60 @@
+import importlib.util
+
+import pytest
+
+np = pytest.importorskip('numpy')
+librosa = pytest.importorskip('librosa')
+pytest.importorskip('soundfile')
+
+from conftest import load_module
+
+# the batched engine is kept in three places; every copy has to agree with librosa and with the others
+COPIES = [
+    ('lib/spec_utils.py', []),
+    ('inference/lib/spec_utils.py', []),
+    ('app/libft2gan/dataset_utils.py', ['torch'])
+]
+
+def engines():
+    # a copy whose package needs something missing here (the training copy imports torch) is left out, not the test
+    return [load_module(path, path.replace('/', '_').replace('.py', '')) for path, requires in COPIES if all(importlib.util.find_spec(name) is not None for name in requires)]
+
+def librosa_stft(wave, hop_length, n_fft, pad_mode):
+    return np.asarray([librosa.stft(np.asfortranarray(w), n_fft=n_fft, hop_length=hop_length, pad_mode=pad_mode) for w in wave])
+
+def librosa_istft(spec, hop_length):
+    return np.asarray([librosa.istft(np.asfortranarray(s), hop_length=hop_length) for s in spec])
+
+@pytest.mark.parametrize('pad_mode', ['constant', 'reflect'])
+@pytest.mark.parametrize('hop_length,n_fft', [(1024, 2048), (512, 2048), (441, 2048)])
+def test_stft_matches_librosa(pad_mode, hop_length, n_fft):
+    wave = np.random.default_rng(0).uniform(-1, 1, (2, 44100 + 123)).astype(np.float32)
+    reference = librosa_stft(wave, hop_length, n_fft, pad_mode)
+    specs = [engine.stft(wave, hop_length, n_fft, pad_mode=pad_mode) for engine in engines()]
+
+    for spec in specs:
+        assert spec.shape == reference.shape
+        np.testing.assert_allclose(spec, reference, rtol=1e-4, atol=1e-3)
+        np.testing.assert_array_equal(spec, specs[0])
+
+@pytest.mark.parametrize('hop_length,n_fft', [(1024, 2048), (512, 2048), (441, 2048)])
+def test_istft_matches_librosa(hop_length, n_fft):
+    wave = np.random.default_rng(1).uniform(-1, 1, (2, 44100 + 123)).astype(np.float32)
+    spec = librosa_stft(wave, hop_length, n_fft, 'constant')
+    reference = librosa_istft(spec, hop_length)
+    waves = [engine.istft(spec, hop_length) for engine in engines()]
+
+    for w in waves:
+        assert w.shape == reference.shape
+        np.testing.assert_allclose(w, reference, atol=1e-4)
+        np.testing.assert_array_equal(w, waves[0])
+
+def test_stft_batches_leading_axes():
+    # clips stacked on a leading axis transform the same as one at a time
+    waves = np.random.default_rng(2).uniform(-1, 1, (3, 2, 22050)).astype(np.float32)
+
+    for engine in engines():
+        batched = engine.stft(waves, 1024, 2048)
+        single = np.stack([engine.stft(w, 1024, 2048) for w in waves])
+        np.testing.assert_allclose(batched, single, atol=1e-6)
+        np.testing.assert_allclose(engine.istft(batched, 1024), np.stack([engine.istft(s, 1024) for s in single]), atol=1e-6)
@@ -0,0 +1,27 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('librosa')
+pytest.importorskip('soundfile')
+
+from lib import spec_utils
+
+@pytest.mark.parametrize('samples', [1500, 44100, 262144 * 2 + 777])
+@pytest.mark.parametrize('block_size', [700, 4096, 262144])
+def test_stream_spectrogram_matches_dense(samples, block_size):
+    wave = np.random.default_rng(samples).uniform(-1, 1, (2, samples)).astype(np.float32)
+    blocks = (wave[:, i:i + block_size] for i in range(0, samples, block_size))
+
+    dense = spec_utils.wave_to_spectrogram(wave, 1024, 2048)
+    streamed = np.concatenate(list(spec_utils.stream_spectrogram(blocks, 1024, 2048)), axis=2)
+
+    assert streamed.shape == dense.shape
+    np.testing.assert_allclose(streamed, dense, atol=1e-4)
+
+def test_stream_spectrogram_reflects_edges():
+    # the first and last frames are where zero padding and reflect padding differ
+    wave = np.random.default_rng(0).uniform(-1, 1, (2, 10000)).astype(np.float32)
+    dense = spec_utils.wave_to_spectrogram(wave, 1024, 2048)
+    streamed = np.concatenate(list(spec_utils.stream_spectrogram([wave[:, :3000], wave[:, 3000:]], 1024, 2048)), axis=2)
+
+    np.testing.assert_allclose(streamed[..., [0, -1]], dense[..., [0, -1]], atol=1e-4)